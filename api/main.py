@@ -1,14 +1,203 @@
-﻿from fastapi import FastAPI, HTTPException, Query
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from contextlib import asynccontextmanager
+from bson import ObjectId
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
 from datetime import datetime, timezone
+import asyncio
+import functools
+import hashlib
+import logging
+import orjson
 import os
+import time
 
-app = FastAPI(title="YouTube Scanner API")
+# Optional Redis response cache (disabled when redis is missing or REDIS_URL unset)
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except Exception:
+    aioredis = None  # optional
+    RedisError = Exception
 
 # Use env if available, else fall back to local Mongo
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/ytscan")
-client = MongoClient(MONGO_URI, tz_aware=True)
-db = client.get_database()
+
+# Connection pool sizing — start small and warm, bench upward
+MONGO_MAX_POOL = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL = int(os.environ.get("MONGO_MIN_POOL_SIZE", "10"))
+# Wire compression; zlib is built in. "zstd"/"snappy" also work once the
+# zstandard/python-snappy packages are installed (pymongo skips missing ones)
+MONGO_COMPRESSORS = os.environ.get("MONGO_COMPRESSORS", "zlib")
+
+# Redis should run with `maxmemory-policy allkeys-lfu` so hot endpoints stay cached
+REDIS_URL = os.environ.get("REDIS_URL")
+# How long an expired entry is kept around as a fallback when Mongo is down
+CACHE_STALE_SECONDS = int(os.environ.get("API_CACHE_STALE_SECONDS", "86400"))
+
+log = logging.getLogger("ytscan.api")
+
+# Compound indexes backing the list endpoints (equality → sort), so Mongo can
+# walk the index in order instead of running an in-memory SORT stage.
+# Names match tools/make_indexes.py so both can be run against the same DB.
+API_INDEXES = [
+    IndexModel([("tracking.status", ASCENDING), ("snippet.publishedAt", DESCENDING), ("_id", DESCENDING)],
+               name="trackStatus_publishedAt_id_desc"),
+    IndexModel([("tracking.status", ASCENDING), ("tracking.discovered_at", DESCENDING), ("_id", DESCENDING)],
+               name="trackStatus_discoveredAt_id_desc"),
+    IndexModel([("tracking.status", ASCENDING), ("tracking.next_poll_after", ASCENDING)],
+               name="trackStatus_nextPoll"),
+    IndexModel([("snippet.channelId", ASCENDING), ("snippet.publishedAt", DESCENDING)],
+               name="channelId_publishedAt_desc"),
+    # /stats "last discovered": newest tracking.discovered_at across all statuses
+    IndexModel([("tracking.discovered_at", DESCENDING)], name="discoveredAt_desc"),
+    # Backs `q` title search ($text); an unanchored /i regex can't use an index
+    IndexModel([("snippet.title", TEXT)], name="title_text"),
+]
+
+# Fields the list endpoints return; stats_snapshots can hold hundreds of
+# entries per video and is only served by /video/{vid}.
+# _id is stringified by the server ($toString, MongoDB 4.4+), so list rows
+# are JSON-ready as decoded and never reach the ObjectId default= hook.
+LIST_PROJECTION = {
+    "_id": {"$toString": "$_id"},
+    "snippet.title": 1,
+    "snippet.publishedAt": 1,
+    "snippet.channelId": 1,
+    "tracking.status": 1,
+    "tracking.discovered_at": 1,
+    "tracking.next_poll_after": 1,
+    "ml_flags.score": 1,
+}
+
+async def ensure_indexes(database) -> None:
+    for model in API_INDEXES:
+        try:
+            await database.videos.create_indexes([model])
+        except OperationFailure as e:
+            # Same keys under another name/options — leave the existing index alone
+            log.warning("Index %s not created: %s", model.document["name"], e)
+
+# Set by the lifespan handler: one shared Motor pool per process
+client: AsyncIOMotorClient | None = None
+db = None
+redis_client = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, redis_client
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        tz_aware=True,
+        maxPoolSize=MONGO_MAX_POOL,
+        minPoolSize=MONGO_MIN_POOL,
+        maxIdleTimeMS=60000,
+        waitQueueTimeoutMS=2000,
+        retryReads=True,
+        compressors=MONGO_COMPRESSORS,
+    )
+    db = client.get_database()
+    # Force server selection + first connection so request #1 doesn't pay for it
+    await client.admin.command("ping")
+    log.info("Mongo pool ready (min=%d, max=%d): %s",
+             MONGO_MIN_POOL, MONGO_MAX_POOL, client.delegate.topology_description)
+    await ensure_indexes(db)
+    if aioredis is not None and REDIS_URL:
+        redis_client = aioredis.from_url(REDIS_URL)
+    try:
+        yield
+    finally:
+        client.close()
+        if redis_client is not None:
+            await redis_client.aclose()
+            redis_client = None
+
+def _orjson_default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class MongoJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also encodes ObjectId, for returning raw Mongo docs.
+
+    Endpoints return this directly so FastAPI skips jsonable_encoder.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_orjson_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+async def _json_array(first, cursor):
+    """Yield `first` plus the rest of a cursor as a JSON array, one encoded document at a time.
+
+    The caller pulls `first` before building the response, so the query has
+    already run (and any error raised) while the status can still be 500.
+    """
+    if first is None:
+        yield b"[]"
+        return
+    yield b"[" + orjson.dumps(first, default=_orjson_default)
+    async for doc in cursor:
+        yield b"," + orjson.dumps(doc, default=_orjson_default)
+    yield b"]"
+
+app = FastAPI(title="YouTube Scanner API", lifespan=lifespan,
+              default_response_class=MongoJSONResponse)
+
+def _cache_key(name: str, params: dict) -> str:
+    raw = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    return f"api:{name}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+def _cached_response(entry: dict, state: str) -> Response:
+    return Response(
+        content=entry[b"body"],
+        status_code=int(entry[b"status"]),
+        media_type="application/json",
+        headers={"X-Cache": state, "X-Generated-At": entry[b"generated_at"].decode()},
+    )
+
+def cached(ttl: int):
+    """Serve the endpoint from Redis for `ttl` seconds.
+
+    Entries outlive their TTL by CACHE_STALE_SECONDS so the last body can be
+    returned (X-Cache: stale) when Mongo raises.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            if redis_client is None:
+                return await func(**kwargs)
+            key = _cache_key(func.__name__, kwargs)
+            now = time.time()
+            try:
+                entry = await redis_client.hgetall(key)
+            except RedisError:
+                entry = {}
+            if entry and now - float(entry[b"generated_at"]) < ttl:
+                return _cached_response(entry, "hit")
+            try:
+                payload = await func(**kwargs)
+            except PyMongoError:
+                if entry:
+                    return _cached_response(entry, "stale")
+                raise
+            if isinstance(payload, Response):
+                body = payload.body
+            else:
+                body = orjson.dumps(jsonable_encoder(payload))
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    pipe.hset(key, mapping={"body": body, "status": 200, "generated_at": now})
+                    pipe.expire(key, ttl + CACHE_STALE_SECONDS)
+                    await pipe.execute()
+            except RedisError:
+                pass
+            return Response(content=body, media_type="application/json", headers={"X-Cache": "miss"})
+        return wrapper
+    return decorator
 
 def _build_query(
     status: str | None,
@@ -22,7 +211,7 @@ def _build_query(
     if status:
         query["tracking.status"] = status
     if q:
-        query["snippet.title"] = {"$regex": q, "$options": "i"}
+        query["$text"] = {"$search": q}
     if channel_id:
         query["snippet.channelId"] = channel_id
 
@@ -37,18 +226,18 @@ def _build_query(
     return query
 
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True, "time": datetime.now(timezone.utc).isoformat()}
 
 @app.get("/videos")
-def list_videos(
+async def list_videos(
     status: str | None = Query(None, description="tracking.status filter"),
     limit: int = Query(50, ge=1, le=200),
     sort: str = Query("published", pattern="^(published|discovered)$",
                       description="Sort by 'published' or 'discovered'"),
     order: str = Query("desc", pattern="^(asc|desc)$",
                        description="Sort order 'asc' or 'desc'"),
-    q: str | None = Query(None, description="Case-insensitive title search"),
+    q: str | None = Query(None, min_length=2, description="Full-text title search"),
     channel_id: str | None = Query(None, description="Filter by snippet.channelId"),
     since: str | None = Query(None, description="ISO timestamp lower-bound"),
     before: str | None = Query(None, description="ISO timestamp upper-bound"),
@@ -59,20 +248,20 @@ def list_videos(
     query = _build_query(status, q, channel_id, sort_field, since, before)
 
     cur = (
-        db.videos.find(query)
+        db.videos.find(query, LIST_PROJECTION)
         .sort([(sort_field, direction), ("_id", direction)])
         .limit(limit)
+        .batch_size(limit)
     )
-    out = []
-    for v in cur:
-        v["_id"] = str(v["_id"])  # ensure string
-        out.append(v)
-    return out
+    # Runs the query (first batch) before the 200 and headers go out
+    first = await anext(cur, None)
+    return StreamingResponse(_json_array(first, cur), media_type="application/json")
 
 @app.get("/videos/count")
-def videos_count(
+@cached(ttl=30)
+async def videos_count(
     status: str | None = Query(None),
-    q: str | None = Query(None),
+    q: str | None = Query(None, min_length=2),
     channel_id: str | None = Query(None),
     since: str | None = Query(None),
     before: str | None = Query(None),
@@ -80,17 +269,28 @@ def videos_count(
 ):
     sort_field = "snippet.publishedAt" if sort == "published" else "tracking.discovered_at"
     query = _build_query(status, q, channel_id, sort_field, since, before)
-    return {"count": db.videos.count_documents(query)}
+    return {"count": await db.videos.count_documents(query)}
 
 @app.get("/stats")
-def stats():
-    total = db.videos.count_documents({})
-    tracking = db.videos.count_documents({"tracking.status": "tracking"})
-    complete = db.videos.count_documents({"tracking.status": "complete"})
-    last = db.videos.find({}, {"_id": 1, "tracking.discovered_at": 1}) \
-                    .sort("tracking.discovered_at", DESCENDING) \
-                    .limit(1)
-    last_doc = next(last, None)
+@cached(ttl=30)
+async def stats():
+    # O(1) from collection metadata instead of a full count
+    total = await db.videos.estimated_document_count()
+    # One pass over the status index instead of one count per status
+    by_status = {
+        d["_id"]: d["c"]
+        async for d in db.videos.aggregate([
+            {"$match": {"tracking.status": {"$in": ["tracking", "complete"]}}},
+            {"$group": {"_id": "$tracking.status", "c": {"$sum": 1}}},
+        ])
+    }
+    tracking = by_status.get("tracking", 0)
+    complete = by_status.get("complete", 0)
+    last = await db.videos.find({}, {"_id": 1, "tracking.discovered_at": 1}) \
+                          .sort("tracking.discovered_at", DESCENDING) \
+                          .limit(1) \
+                          .to_list(length=1)
+    last_doc = last[0] if last else None
     last_discovered_at = None
     if last_doc and isinstance(last_doc, dict):
         last_discovered_at = last_doc.get("tracking", {}).get("discovered_at")
@@ -101,28 +301,54 @@ def stats():
         "last_discovered_at": last_discovered_at,
     }
 
+# Hot documents (the dashboard re-polls the selected video on every render)
+# and in-flight lookups, so concurrent requests for one id share a find_one.
+# Only used without Redis: cached() already keeps /video/{vid} for 30s there,
+# and a second tier would double the staleness. Kept small since full docs
+# carry the whole stats_snapshots array.
+_video_cache: TTLCache = TTLCache(maxsize=256, ttl=30)
+_video_inflight: dict[str, asyncio.Future] = {}
+
+async def _load_video(vid: str) -> dict | None:
+    use_local = redis_client is None
+    if use_local and vid in _video_cache:
+        return _video_cache[vid]
+    fut = _video_inflight.get(vid)
+    if fut is None:
+        fut = asyncio.ensure_future(db.videos.find_one({"_id": vid}))
+        _video_inflight[vid] = fut
+        fut.add_done_callback(lambda _: _video_inflight.pop(vid, None))
+    v = await asyncio.shield(fut)
+    if use_local and v is not None:
+        _video_cache[vid] = v
+    return v
+
 @app.get("/video/{vid}")
-def get_video(vid: str):
-    v = db.videos.find_one({"_id": vid})
+@cached(ttl=30)
+async def get_video(vid: str):
+    v = await _load_video(vid)
     if not v:
         raise HTTPException(404, "Video not found")
-    v["_id"] = str(v["_id"])
-    return v
+    return MongoJSONResponse(v)
 
 @app.get("/tracking")
-def tracking(limit: int = Query(50, ge=1, le=200)):
+@cached(ttl=5)
+async def tracking(limit: int = Query(50, ge=1, le=200)):
     cur = (
-        db.videos.find({"tracking.status": "tracking"})
+        db.videos.find({"tracking.status": "tracking"}, LIST_PROJECTION)
         .sort("tracking.next_poll_after", ASCENDING)
         .limit(limit)
+        .batch_size(limit)
     )
-    return [{**v, "_id": str(v["_id"])} for v in cur]
+    return MongoJSONResponse(await cur.to_list(length=limit))
 
 @app.get("/complete")
-def complete(limit: int = Query(50, ge=1, le=200)):
+@cached(ttl=60)
+async def complete(limit: int = Query(50, ge=1, le=200)):
     cur = (
-        db.videos.find({"tracking.status": "complete"})
+        db.videos.find({"tracking.status": "complete"}, LIST_PROJECTION)
         .sort("snippet.publishedAt", DESCENDING)
         .limit(limit)
+        .batch_size(limit)
     )
-    return [{**v, "_id": str(v["_id"])} for v in cur]
+    return MongoJSONResponse(await cur.to_list(length=limit))
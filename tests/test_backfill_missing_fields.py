@@ -0,0 +1,269 @@
+"""
+backfill_missing_fields: a failed API batch must not throw away the batches
+that succeeded; scan/flag/migrate candidate selection and flag clearing.
+Mongo and YouTube are faked.
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("dotenv")
+pytest.importorskip("orjson")
+pytest.importorskip("pymongo")
+
+os.environ.setdefault("YT_API_KEY", "test-key")
+
+_PATH = Path(__file__).resolve().parents[1] / "tools" / "backfill_missing_fields.py"
+_spec = importlib.util.spec_from_file_location("backfill_missing_fields", _PATH)
+bf = importlib.util.module_from_spec(_spec)
+sys.modules["backfill_missing_fields"] = bf
+_spec.loader.exec_module(bf)
+
+
+_MISSING = object()
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _matches(doc, query):
+    """The subset of the Mongo query language the backfill queries use."""
+    for key, cond in query.items():
+        if key == "$and":
+            ok = all(_matches(doc, q) for q in cond)
+        elif key == "$or":
+            ok = any(_matches(doc, q) for q in cond)
+        elif key == "$nor":
+            ok = not any(_matches(doc, q) for q in cond)
+        else:
+            val = _get(doc, key)
+            present = val is not _MISSING
+            if isinstance(cond, dict):
+                ok = True
+                for op, arg in cond.items():
+                    if op == "$exists":
+                        ok = ok and present == arg
+                    elif op == "$ne":
+                        ok = ok and (val if present else None) != arg
+                    elif op == "$in":
+                        ok = ok and present and val in arg
+                    else:
+                        raise NotImplementedError(op)
+            else:
+                ok = present and val == cond
+        if not ok:
+            return False
+    return True
+
+
+def _set_path(doc, path, value):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    if value is _MISSING:
+        doc.pop(leaf, None)
+    else:
+        doc[leaf] = value
+
+
+class UpdateResult:
+    def __init__(self, n):
+        self.modified_count = n
+
+
+class FakeColl:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.ops = []
+
+    def find(self, query, proj=None):
+        return FakeCursor([d for d in self.docs if _matches(d, query)])
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+    def update_many(self, query, update):
+        n = 0
+        for d in self.find(query):
+            for path, value in update.get("$set", {}).items():
+                _set_path(d, path, value)
+            for path in update.get("$unset", {}):
+                _set_path(d, path, _MISSING)
+            n += 1
+        return UpdateResult(n)
+
+    def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+
+
+class FakeCursor(list):
+    def hint(self, _):
+        return self
+
+
+class FakeDB:
+    def __init__(self):
+        self.channels = FakeColl()
+        self.videos = FakeColl()
+
+
+def _quota_error():
+    return bf.YouTubeAPIError(403, {"error": {"errors": [{"reason": "quotaExceeded"}]}})
+
+
+def test_handles_writes_good_batches_before_quota_exit(monkeypatch):
+    bf._HANDLE_CACHE.clear()
+    # 60 channels -> two batches; the second one hits the quota
+    docs = [(f"v{i}", f"c{i}", None, True) for i in range(60)]
+
+    async def fake_fetch(session, sem, ids):
+        if "c50" in ids:
+            raise _quota_error()
+        return {cid: "@" + cid for cid in ids}
+
+    monkeypatch.setattr(bf, "fetch_channel_handles", fake_fetch)
+    monkeypatch.setattr(bf, "BF_DRY_RUN", False)
+    db = FakeDB()
+
+    with pytest.raises(SystemExit) as exc:
+        asyncio.run(bf.backfill_handles(docs, db, None, asyncio.Semaphore(1)))
+
+    assert exc.value.code == bf.EXIT_QUOTA
+    assert len(db.channels.ops) == 50
+    assert sorted(op._filter["_id"] for op in db.videos.ops) == sorted(f"v{i}" for i in range(50))
+
+
+def test_duration_writes_good_batches_before_error_exit(monkeypatch):
+    need = [f"v{i}" for i in range(120)]
+
+    async def fake_fetch(session, sem, ids):
+        if "v60" in ids:
+            raise bf.YouTubeAPIError(500, {"error": "boom"})
+        return {vid: {"contentDetails": {"duration": "PT5M"}, "liveStreamingDetails": {}} for vid in ids}
+
+    monkeypatch.setattr(bf, "fetch_video_details", fake_fetch)
+    monkeypatch.setattr(bf, "BF_DRY_RUN", False)
+    db = FakeDB()
+
+    with pytest.raises(SystemExit) as exc:
+        asyncio.run(bf.backfill_duration(need, db, None, asyncio.Semaphore(1)))
+
+    assert exc.value.code == 1
+    # batches v0-v49 and v100-v119 succeeded; v50-v99 failed
+    written = {op._filter["_id"] for op in db.videos.ops}
+    assert written == {f"v{i}" for i in list(range(50)) + list(range(100, 120))}
+    assert all(op._doc["$set"]["snippet.lengthBucket"] == "medium" for op in db.videos.ops)
+
+
+# --- candidate selection (BF_QUERY_MODE) and needsBackfill ---
+
+def _video(vid, flagged=False, handle=None, duration=None, bucket=None, status="tracking"):
+    sn = {"channelId": "c-" + vid}
+    if handle:
+        sn["channelHandle"] = handle
+    if duration:
+        sn["durationISO"] = duration
+    if bucket:
+        sn["lengthBucket"] = bucket
+    if flagged:
+        sn["needsBackfill"] = True
+    src = {"channelHandle": handle} if handle else {}
+    return {"_id": vid, "snippet": sn, "source": src, "tracking": {"status": status}}
+
+
+@pytest.fixture
+def videos(monkeypatch):
+    monkeypatch.setattr(bf, "BF_TARGET", "all")
+    monkeypatch.setattr(bf, "BF_FILL_HANDLE", True)
+    monkeypatch.setattr(bf, "BF_FILL_DURATION", True)
+    monkeypatch.setattr(bf, "BF_SKIP_LIVE", True)
+    return FakeColl([
+        _video("legacy"),                                                      # pre-flag doc, all missing
+        _video("flagged", flagged=True),                                       # written by discover
+        _video("done", handle="@h", duration="PT1M", bucket="short"),          # nothing to fill
+        _video("live", flagged=True, bucket="live"),                           # skipped by BF_SKIP_LIVE
+        _video("new", status="new"),                                           # outside BF_TARGET
+    ])
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("scan", ["legacy", "flagged"]),
+    ("flag", ["flagged"]),
+])
+def test_query_mode_selects_candidates(monkeypatch, videos, mode, expected):
+    monkeypatch.setattr(bf, "BF_QUERY_MODE", mode)
+    assert [d["_id"] for d in videos.find(bf.build_query())] == expected
+
+
+def test_nothing_to_fill_matches_nothing(monkeypatch, videos):
+    monkeypatch.setattr(bf, "BF_FILL_HANDLE", False)
+    monkeypatch.setattr(bf, "BF_FILL_DURATION", False)
+    assert videos.find(bf.build_query()) == []
+    assert bf.migrate_backfill_flags(FakeDB()) == 0
+
+
+def test_migrate_flags_legacy_docs_for_flag_mode(monkeypatch, videos):
+    db = FakeDB()
+    db.videos = videos
+
+    assert bf.migrate_backfill_flags(db, dry_run=True) == 1
+    assert "needsBackfill" not in _get(videos.docs[0], "snippet")
+
+    assert bf.migrate_backfill_flags(db) == 1
+    assert bf.migrate_backfill_flags(db) == 0  # idempotent
+
+    monkeypatch.setattr(bf, "BF_QUERY_MODE", "flag")
+    assert [d["_id"] for d in videos.find(bf.build_query())] == ["legacy", "flagged"]
+
+
+def test_migrate_mode_needs_no_api_key(monkeypatch, videos):
+    class FakeClient:
+        def __init__(self, uri):
+            self.db = FakeDB()
+            self.db.videos = videos
+
+        def get_database(self):
+            return self.db
+
+    monkeypatch.setattr(bf, "MongoClient", FakeClient)
+    monkeypatch.setattr(bf, "BF_QUERY_MODE", "migrate")
+    monkeypatch.setattr(bf, "BF_DRY_RUN", False)
+    monkeypatch.setattr(bf, "API_KEY", None)
+
+    assert asyncio.run(bf.main_async()) == 0
+    assert _get(videos.docs[0], "snippet.needsBackfill") is True
+
+
+def test_attempted_flags_are_cleared_even_when_unfillable(monkeypatch, videos):
+    # e.g. BF_FILL_HANDLE=0 or a channel without customUrl: handle stays missing
+    monkeypatch.setattr(bf, "BF_QUERY_MODE", "flag")
+    db = FakeDB()
+    db.videos = videos
+
+    assert bf.clear_backfill_flags(db, ["flagged"]) == 1
+    # the next flag-mode run moves on instead of re-selecting the same doc
+    assert [d["_id"] for d in videos.find(bf.build_query())] == []
+    assert _get(videos.docs[3], "snippet.needsBackfill") is True  # not attempted, kept
+
+
+@pytest.mark.parametrize("secs, bucket", [
+    (None, None),
+    (0, "short"),
+    (239, "short"),
+    (240, "medium"),
+    (1200, "medium"),
+    (1201, "long"),
+])
+def test_bucket_from_seconds_edges(secs, bucket):
+    # same thresholds as the server-side $switch in recompute_buckets_server_side
+    assert bf.bucket_from_seconds(secs) == bucket
@@ -0,0 +1,204 @@
+"""
+run_once must keep what a pass already found when a later page fails.
+Mongo and YouTube are faked; only the paging/flush logic in discover_once runs.
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("cachetools")
+pytest.importorskip("pymongo")
+
+os.environ.setdefault("YT_SKIP_DOTENV", "1")
+os.environ.setdefault("YT_API_KEY", "test-key")
+
+_PATH = Path(__file__).resolve().parents[1] / "worker" / "discover_once.py"
+_spec = importlib.util.spec_from_file_location("discover_once", _PATH)
+discover_once = importlib.util.module_from_spec(_spec)
+sys.modules["discover_once"] = discover_once  # dataclasses resolve annotations through sys.modules
+_spec.loader.exec_module(discover_once)
+
+
+def _page(vids, token):
+    items = [{"id": {"videoId": v}, "snippet": {"title": v, "liveBroadcastContent": "none"}} for v in vids]
+    return {"items": items, "nextPageToken": token}
+
+
+def test_timeout_on_later_page_still_saves_earlier_items(monkeypatch):
+    pages = iter([_page(["a1", "a2"], "p2")])
+
+    async def fake_search_page(session, sem, wp, page_token):
+        try:
+            return next(pages)
+        except StopIteration:
+            raise asyncio.TimeoutError()
+
+    async def fake_known_ids(db, vids):
+        return set()
+
+    async def fake_videos_details(session, sem, video_ids):
+        return {v: {"snippet": {"categoryId": "10"}, "contentDetails": {"duration": "PT1M"}} for v in video_ids}
+
+    inserted = []
+
+    async def fake_upsert_minimal(items, db, region_used, query_used, existing=None):
+        inserted.extend(items)
+        return len(items)
+
+    monkeypatch.setattr(discover_once, "search_page", fake_search_page)
+    monkeypatch.setattr(discover_once, "known_ids", fake_known_ids)
+    monkeypatch.setattr(discover_once, "videos_details", fake_videos_details)
+    monkeypatch.setattr(discover_once, "upsert_minimal", fake_upsert_minimal)
+    monkeypatch.setattr(discover_once, "DISCOVER_MODE", "search")
+    monkeypatch.setattr(discover_once, "MAX_PAGES", 3)
+    monkeypatch.setattr(discover_once, "EMPTY_STREAK_LIMIT", 0)
+
+    rc = asyncio.run(discover_once.run_once(db=None, session=None, sem=asyncio.Semaphore(1)))
+
+    assert rc == 1
+    assert [it["id"]["videoId"] for it in inserted] == ["a1", "a2"]
+    # enriched before the save, not stored bare
+    assert all(it["snippet"].get("categoryId") == "10" for it in inserted)
+
+
+def test_trending_keeps_chart_videos_older_than_the_near_now_window(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    published = (datetime.now(timezone.utc) - timedelta(hours=3)).isoformat()
+
+    async def fake_get_json(session, sem, url, params):
+        return {"items": [{
+            "id": "t1",
+            "snippet": {"title": "t1", "publishedAt": published, "categoryId": "10", "liveBroadcastContent": "none"},
+            "contentDetails": {"duration": "PT3M"},
+        }]}
+
+    async def fake_known_ids(db, vids):
+        return set()
+
+    inserted = []
+
+    async def fake_upsert_minimal(items, db, region_used, query_used, existing=None):
+        inserted.extend(items)
+        return len(items)
+
+    monkeypatch.setattr(discover_once, "_get_json", fake_get_json)
+    monkeypatch.setattr(discover_once, "known_ids", fake_known_ids)
+    monkeypatch.setattr(discover_once, "upsert_minimal", fake_upsert_minimal)
+    monkeypatch.setattr(discover_once, "DISCOVER_MODE", "trending")
+    monkeypatch.setattr(discover_once, "DURATION_MODE", "any")
+    monkeypatch.setattr(discover_once, "SINCE_MINUTES", 20)
+    monkeypatch.setattr(discover_once, "MAX_PAGES", 1)
+
+    rc = asyncio.run(discover_once.run_once(db=None, session=None, sem=asyncio.Semaphore(1)))
+
+    assert rc == 0
+    assert [it["id"]["videoId"] for it in inserted] == ["t1"]
+
+
+def test_cancelled_pass_keeps_flushed_and_pending_items(monkeypatch):
+    pages = {None: _page(["a1", "a2"], "p2"), "p2": _page(["b1"], "p3")}
+    hanging = None
+
+    async def fake_search_page(session, sem, wp, page_token):
+        if page_token in pages:
+            return pages[page_token]
+        hanging.set()
+        await asyncio.Event().wait()  # page 3 never answers
+
+    async def fake_known_ids(db, vids):
+        return set()
+
+    details_calls = []
+
+    async def fake_videos_details(session, sem, video_ids):
+        details_calls.append(list(video_ids))
+        return {v: {"snippet": {"categoryId": "10"}, "contentDetails": {"duration": "PT1M"}} for v in video_ids}
+
+    inserted = []
+
+    async def fake_upsert_minimal(items, db, region_used, query_used, existing=None):
+        inserted.extend(items)
+        return len(items)
+
+    monkeypatch.setattr(discover_once, "search_page", fake_search_page)
+    monkeypatch.setattr(discover_once, "known_ids", fake_known_ids)
+    monkeypatch.setattr(discover_once, "videos_details", fake_videos_details)
+    monkeypatch.setattr(discover_once, "upsert_minimal", fake_upsert_minimal)
+    monkeypatch.setattr(discover_once, "DISCOVER_MODE", "search")
+    monkeypatch.setattr(discover_once, "MAX_PAGES", 5)
+    monkeypatch.setattr(discover_once, "EMPTY_STREAK_LIMIT", 0)
+    monkeypatch.setattr(discover_once, "ENRICH_FLUSH_IDS", 2)
+
+    async def scenario():
+        nonlocal hanging
+        hanging = asyncio.Event()
+        task = asyncio.create_task(discover_once.run_once(db=None, session=None, sem=asyncio.Semaphore(1)))
+        await hanging.wait()
+        await asyncio.sleep(0)  # let page 2 be processed while page 3 is in flight
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+
+    # page 1 was flushed (enriched + inserted) as soon as ENRICH_FLUSH_IDS was reached;
+    # b1 was still pending and is stored bare, without a new videos.list call
+    assert [it["id"]["videoId"] for it in inserted] == ["a1", "a2", "b1"]
+    assert details_calls == [["a1", "a2"]]
+    assert "categoryId" not in inserted[2]["snippet"]
+
+
+# --- hand-written replacements for library calls: same results as the originals ---
+
+@pytest.mark.parametrize("secs, bucket", [
+    (None, None),
+    (0, "short"),
+    (239, "short"),
+    (240, "medium"),
+    (1200, "medium"),
+    (1201, "long"),
+    (36000, "long"),
+])
+def test_bucket_from_seconds_edges(secs, bucket):
+    assert discover_once.bucket_from_seconds(secs) == bucket
+
+
+@pytest.mark.parametrize("pool, choices, cum_weights", [
+    ("", (), ()),
+    (" , ,", (), ()),
+    ("only", ("only",), (1.0,)),
+    ("a:0,b:-2,c:3", ("c",), (3.0,)),
+    ("a:0,b:-1", (), ()),
+    ("live:5, news:3,gaming", ("live", "news", "gaming"), (5.0, 8.0, 9.0)),
+    ("x:abc", ("x",), (1.0,)),
+])
+def test_weighted_pool_cdf(pool, choices, cum_weights):
+    assert discover_once.weighted_pool_cdf(pool) == (choices, cum_weights)
+
+
+@pytest.mark.parametrize("pool", ["only", "a:1,b:1", "live:5,news:3,gaming:4,music:2,trailer:1", "a:0.5,b:0,c:2"])
+def test_weighted_pick_matches_random_choices(pool):
+    import random
+
+    choices, cum_weights = discover_once.weighted_pool_cdf(pool)
+    for seed in range(500):
+        random.seed(seed)
+        ours = discover_once.weighted_pick(choices, cum_weights)
+        random.seed(seed)
+        assert ours == random.choices(choices, cum_weights=cum_weights, k=1)[0]
+
+
+def test_pick_with_empty_pool_means_no_query(monkeypatch):
+    monkeypatch.setattr(discover_once, "_QUERY_POOLS", {})
+    monkeypatch.setattr(discover_once, "_GLOBAL_QUERY_POOL", discover_once.weighted_pool_cdf("a:0"))
+    assert discover_once.pick_query_for_region("US") is None
+
+    monkeypatch.setattr(discover_once, "DURATION_MODE", "mix")
+    monkeypatch.setattr(discover_once, "DURATION_POOL", "")
+    assert discover_once.pick_duration_param() is None
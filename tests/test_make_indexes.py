@@ -0,0 +1,64 @@
+"""
+make_indexes: the prefix-redundancy warning fires for a plain spec covered by
+a compound one, and the shipped index maps don't trigger it.
+"""
+import importlib.util
+import logging
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+_PATH = Path(__file__).resolve().parents[1] / "tools" / "make_indexes.py"
+
+
+@pytest.fixture(scope="module")
+def mi(tmp_path_factory):
+    # the module sets up a file log handler in the working directory on import
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("make_indexes"))
+    try:
+        spec = importlib.util.spec_from_file_location("make_indexes", _PATH)
+        mod = importlib.util.module_from_spec(spec)
+        sys.modules["make_indexes"] = mod
+        spec.loader.exec_module(mod)
+    finally:
+        os.chdir(cwd)
+    return mod
+
+
+def _warnings(caplog):
+    return [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+
+
+@pytest.mark.parametrize("specs, redundant", [
+    # plain prefix of a compound spec
+    ([{"keys": [("a", 1)]}, {"keys": [("a", 1), ("b", -1)]}], ["[('a', 1)] is a prefix"]),
+    # longer prefix, the shorter one is reported once
+    ([{"keys": [("a", 1), ("b", 1)]}, {"keys": [("a", 1), ("b", 1), ("c", 1)]}], ["[('a', 1), ('b', 1)] is a prefix"]),
+    # direction differs: not a prefix
+    ([{"keys": [("a", -1)]}, {"keys": [("a", 1), ("b", 1)]}], []),
+    # unique / partial specs carry a constraint and are kept quietly
+    ([{"keys": [("a", 1)], "unique": True}, {"keys": [("a", 1), ("b", 1)]}], []),
+    ([{"keys": [("a", 1)], "partial": {"a": True}}, {"keys": [("a", 1), ("b", 1)]}], []),
+    # same keys is not a strict prefix
+    ([{"keys": [("a", 1)]}, {"keys": [("a", 1)], "name": "dup"}], []),
+])
+def test_warn_prefix_redundant(mi, caplog, specs, redundant):
+    with caplog.at_level(logging.WARNING):
+        mi._warn_prefix_redundant("videos", specs)
+    msgs = _warnings(caplog)
+    assert len(msgs) == len(redundant)
+    for msg, expected in zip(msgs, redundant):
+        assert expected in msg
+
+
+def test_shipped_index_maps_have_no_redundant_prefix(mi, caplog):
+    with caplog.at_level(logging.WARNING):
+        for index_map in (mi.INDEX_MAP, mi.MINIMAL_INDEX_MAP):
+            for coll, specs in index_map.items():
+                mi._warn_prefix_redundant(coll, specs)
+    assert _warnings(caplog) == []
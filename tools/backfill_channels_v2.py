@@ -10,11 +10,12 @@ import os
 import sys
 import io
 import argparse
+import asyncio
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Set, Optional
 
-import requests
-from pymongo import MongoClient, UpdateOne
+import httpx
+from pymongo import MongoClient, UpdateOne, WriteConcern
 from dotenv import load_dotenv
 
 try:
@@ -31,6 +32,15 @@ MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/ytscan")
 EXIT_QUOTA = 88
 CHANNELS_URL = "https://www.googleapis.com/youtube/v3/channels"
 
+# YouTube serves 10-20 concurrent requests per key comfortably
+HTTP_CONCURRENCY = 16
+HTTP_LIMITS = httpx.Limits(max_connections=20)
+
+# Flush channel upserts every N ops so progress survives a mid-run failure
+FLUSH_EVERY = 500
+# Backfill writes are re-derivable: acknowledge without waiting for the journal
+BACKFILL_WC = WriteConcern(w=1, j=False)
+
 
 def batched(seq, n):
     buf = []
@@ -52,7 +62,7 @@ def to_int_or_none(v: Optional[str]) -> Optional[int]:
         return None
 
 
-def fetch_channel_snippets_and_stats(ids: List[str]) -> Dict[str, Dict[str, Any]]:
+async def fetch_channel_snippets_and_stats(client: httpx.AsyncClient, sem: asyncio.Semaphore, ids: List[str]) -> Dict[str, Dict[str, Any]]:
     """Return {channelId: {title, handle, stats{subscriberCount,videoCount,viewCount}}}"""
     if not ids:
         return {}
@@ -61,7 +71,8 @@ def fetch_channel_snippets_and_stats(ids: List[str]) -> Dict[str, Dict[str, Any]
         "part": "snippet,statistics",
         "id": ",".join(ids[:50])
     }
-    r = requests.get(CHANNELS_URL, params=params, timeout=30)
+    async with sem:
+        r = await client.get(CHANNELS_URL, params=params)
     r.raise_for_status()
     out: Dict[str, Dict[str, Any]] = {}
     for it in r.json().get("items", []):
@@ -88,13 +99,65 @@ def fetch_channel_snippets_and_stats(ids: List[str]) -> Dict[str, Dict[str, Any]
     return out
 
 
+async def fetch_all(chunks: List[List[str]]):
+    """Yield (chunk, result) as each 50-id chunk completes; a failed chunk yields its exception."""
+    sem = asyncio.Semaphore(HTTP_CONCURRENCY)
+    async with httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=30) as client:
+        async def one(chunk: List[str]):
+            try:
+                return chunk, await fetch_channel_snippets_and_stats(client, sem, chunk)
+            except Exception as e:
+                return chunk, e
+        for fut in asyncio.as_completed([one(c) for c in chunks]):
+            yield await fut
+
+
+async def run_backfill(db, targets: List[str], dry_run: bool):
+    """Fetch + upsert all targets. Returns (processed, first_error)."""
+    channels = db.channels.with_options(write_concern=BACKFILL_WC)
+    processed = 0
+    ops: List[UpdateOne] = []
+    now_iso = datetime.now(timezone.utc).isoformat()
+    first_error: Optional[BaseException] = None
+
+    async for chunk, data in fetch_all(list(batched(targets, 50))):
+        if isinstance(data, BaseException):
+            first_error = first_error or data
+            continue
+        for cid in chunk:
+            info = data.get(cid) or {}
+            doc = {
+                "handle": info.get("handle"),
+                "title": info.get("title"),
+                "stats": info.get("stats", {}),
+                "last_checked_at": now_iso,
+            }
+            if dry_run:
+                print(f" - {cid} | handle={doc.get('handle')} | title={doc.get('title')} | stats={doc.get('stats')}")
+            else:
+                ops.append(UpdateOne({"_id": cid}, {"$set": doc}, upsert=True))
+        processed += len(chunk)
+
+        if len(ops) >= FLUSH_EVERY:
+            await asyncio.to_thread(channels.bulk_write, list(ops), ordered=False)
+            ops.clear()
+
+    # Persist the chunks that did succeed before reporting a failure
+    if ops:
+        await asyncio.to_thread(channels.bulk_write, ops, ordered=False)
+
+    return processed, first_error
+
+
 def pick_missing_or_stale(db, stale_hours: int, limit: int) -> List[str]:
-    vids = db.videos.find({}, {"snippet.channelId": 1}).limit(1_000_000)
-    all_ids: Set[str] = set()
-    for v in vids:
-        cid = (v.get("snippet") or {}).get("channelId")
-        if cid:
-            all_ids.add(cid)
+    # Dedup server-side; the leading $sort lets $group walk the
+    # channelId_publishedAt_desc index prefix (DISTINCT_SCAN)
+    cur = db.videos.aggregate([
+        {"$sort": {"snippet.channelId": 1}},
+        {"$group": {"_id": "$snippet.channelId"}},
+        {"$match": {"_id": {"$ne": None}}},
+    ], allowDiskUse=True)
+    all_ids: Set[str] = {d["_id"] for d in cur if d["_id"]}
 
     if not all_ids:
         return []
@@ -157,41 +220,22 @@ def main() -> int:
         return 0
     print(f"Backfilling channels: {len(targets)} (stale_hours={args.stale_hours}, limit={args.limit})")
 
-    processed = 0
-    ops: List[UpdateOne] = []
-    now_iso = datetime.now(timezone.utc).isoformat()
-
     try:
-        for chunk in batched(targets, 50):
-            data = fetch_channel_snippets_and_stats(chunk)
-            for cid in chunk:
-                info = data.get(cid) or {}
-                doc = {
-                    "handle": info.get("handle"),
-                    "title": info.get("title"),
-                    "stats": info.get("stats", {}),
-                    "last_checked_at": now_iso,
-                }
-                if args.dry_run:
-                    print(f" - {cid} | handle={doc.get('handle')} | title={doc.get('title')} | stats={doc.get('stats')}")
-                else:
-                    ops.append(UpdateOne({"_id": cid}, {"$set": doc}, upsert=True))
-            processed += len(chunk)
-
-        if ops and not args.dry_run:
-            db.channels.bulk_write(ops, ordered=False)
+        processed, first_error = asyncio.run(run_backfill(db, targets, args.dry_run))
+
+        if isinstance(first_error, httpx.HTTPStatusError):
+            try:
+                body = first_error.response.json()
+            except Exception:
+                body = {"error": str(first_error)}
+            print("YouTube API error:", body, file=sys.stderr)
+            return 1
+        if first_error is not None:
+            raise first_error
 
         print(f"Done. Processed: {processed} channels.")
         return 0
 
-    except requests.HTTPError as e:
-        try:
-            body = e.response.json()
-        except Exception:
-            body = {"error": str(e)}
-        print("YouTube API error:", body, file=sys.stderr)
-        return 1
-
     except Exception as e:
         print("Error:", e, file=sys.stderr)
         return 1
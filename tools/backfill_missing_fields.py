@@ -32,18 +32,27 @@
 #     - BF_SKIP_LIVE           1/0 bỏ qua item lengthBucket=live (default: 1)
 #     - BF_LOG_SAMPLE          số dòng sample để in ra          (default: 5)
 #     - BF_DRY_RUN             1/0 chỉ in log, KHÔNG ghi DB     (default: 0)
+#     - BF_QUERY_MODE          scan | flag | migrate            (default: scan)
+#                              scan:    quét $exists như cũ — bắt được cả dữ liệu cũ chưa có cờ
+#                              flag:    chỉ lấy video có snippet.needsBackfill=true (discover_once ghi cờ này);
+#                                       chỉ dùng SAU khi đã chạy migrate một lần
+#                              migrate: one-off — gắn needsBackfill=true cho mọi video khớp query scan
+#                                       (dữ liệu ghi trước khi có cờ), rồi thoát; không gọi API
 #
 # Mongo indexes (khuyến nghị):
 #   db.videos.createIndex({ "tracking.status": 1, "tracking.next_poll_after": 1 })
 #   db.videos.createIndex({ "snippet.publishedAt": -1 })
+#   db.videos.createIndex({ "snippet.needsBackfill": 1 }, { partialFilterExpression: { "snippet.needsBackfill": true } })
 #
 from __future__ import annotations
 
-import os, sys, io, re
+import os, sys, io, asyncio
+from bisect import bisect_right
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
-import requests
+import aiohttp
+import orjson
 from pymongo import MongoClient, UpdateOne
 from dotenv import load_dotenv
 
@@ -69,60 +78,131 @@ BF_FILL_DURATION = os.getenv("BF_FILL_DURATION", "1").lower() in ("1","true","ye
 BF_SKIP_LIVE     = os.getenv("BF_SKIP_LIVE", "1").lower() in ("1","true","yes")
 BF_LOG_SAMPLE    = max(0, int(os.getenv("BF_LOG_SAMPLE", "5")))
 BF_DRY_RUN       = os.getenv("BF_DRY_RUN", "0").lower() in ("1","true","yes")
+BF_QUERY_MODE    = os.getenv("BF_QUERY_MODE", "scan").lower()      # scan|flag|migrate
 
 VIDEOS_URL   = "https://www.googleapis.com/youtube/v3/videos"
 CHANNELS_URL = "https://www.googleapis.com/youtube/v3/channels"
 EXIT_QUOTA   = 88
 
+# All 50-ID batches are fetched concurrently, capped by this semaphore
+HTTP_CONCURRENCY = 8
+# Writes are merged across API batches and sent as unordered bulks of this size
+BULK_CHUNK = 1000
+# db.channels handle lookups are split into $in chunks of this size and read in parallel
+LOOKUP_CHUNK = 500
+# Transient 5xx responses are retried on the shared session with exponential backoff
+HTTP_RETRIES       = 3
+HTTP_BACKOFF       = 0.5
+HTTP_RETRY_STATUS  = {500, 502, 503, 504}
+
 # --- Duration helpers ---
-_DUR_RE = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?$', re.I)
+_DUR_UNITS = {"H": 3600, "M": 60, "S": 1}
 
 def iso8601_to_seconds(s: Optional[str]) -> Optional[int]:
-    if not s:
+    """Parse 'PT#H#M#S' in a single pass (no regex); None if not that shape."""
+    if not s or s[:2].upper() != "PT":
         return None
-    m = _DUR_RE.match(s)
-    if not m:
+    total = num = 0
+    digits = False
+    last = 4_000  # unit factors must strictly decrease (H > M > S)
+    for c in s[2:]:
+        if "0" <= c <= "9":
+            num = num * 10 + (ord(c) - 48)
+            digits = True
+            continue
+        factor = _DUR_UNITS.get(c.upper())
+        if factor is None or not digits or factor >= last:
+            return None
+        total += num * factor
+        num, digits, last = 0, False, factor
+    if digits:
         return None
-    h, mnt, sec = (int(x) if x else 0 for x in m.groups())
-    return h * 3600 + mnt * 60 + sec
+    return total
+
+# short: < 4 min, medium: <= 20 min, long: above (edges are for whole seconds)
+_BUCKETS = ("short", "medium", "long")
+_BUCKET_EDGES = (4*60, 20*60 + 1)
 
 def bucket_from_seconds(secs: Optional[int]) -> Optional[str]:
     if secs is None:
         return None
-    if secs < 4*60:
-        return "short"
-    if secs <= 20*60:
-        return "medium"
-    return "long"
+    return _BUCKETS[bisect_right(_BUCKET_EDGES, secs)]
 
 def now_utc_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 # --- API helpers ---
-def fetch_channel_handles(channel_ids: List[str]) -> Dict[str, str]:
+class YouTubeAPIError(Exception):
+    """Non-2xx response from the YouTube Data API, with its decoded JSON body."""
+    def __init__(self, status: int, body: Any):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.body = body
+
+async def _get_json(session: aiohttp.ClientSession, sem: asyncio.Semaphore, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    async with sem:
+        for attempt in range(HTTP_RETRIES + 1):
+            async with session.get(url, params=params) as resp:
+                raw = await resp.read()
+                try:
+                    body = orjson.loads(raw)
+                except orjson.JSONDecodeError:
+                    body = {"error": raw.decode("utf-8", errors="replace")}
+                if resp.status in HTTP_RETRY_STATUS and attempt < HTTP_RETRIES:
+                    await asyncio.sleep(HTTP_BACKOFF * (2 ** attempt))
+                    continue
+                if resp.status >= 400:
+                    raise YouTubeAPIError(resp.status, body)
+                return body
+
+_QUOTA_REASONS = frozenset({"quotaExceeded", "dailyLimitExceeded", "rateLimitExceeded", "userRateLimitExceeded"})
+
+def _error_reason(body: Any) -> Optional[str]:
+    reason = None
+    err = body.get("error") if isinstance(body, dict) else None
+    if isinstance(err, dict):
+        errs = err.get("errors") or []
+        if isinstance(errs, list) and errs:
+            reason = errs[0].get("reason")
+        reason = reason or err.get("status") or err.get("message")
+    return reason
+
+def _quota_exhausted(e: YouTubeAPIError) -> bool:
+    return e.status == 403 and _error_reason(e.body) in _QUOTA_REASONS
+
+def _first_error_code(label: str, errors: List[BaseException]) -> Optional[int]:
+    """Report the first failed batch (after the good ones are written); exit code or None."""
+    if not errors:
+        return None
+    e = errors[0]
+    if isinstance(e, YouTubeAPIError) and _quota_exhausted(e):
+        print(f"{label}: quota exhausted — stop.", file=sys.stderr)
+        return EXIT_QUOTA
+    print(f"{label}: YouTube API error:", e.body if isinstance(e, YouTubeAPIError) else repr(e), file=sys.stderr)
+    return 1
+
+async def fetch_channel_handles(session: aiohttp.ClientSession, sem: asyncio.Semaphore, channel_ids: List[str]) -> Dict[str, str]:
     """Return {channelId: '@handle'} via channels.list(snippet.customUrl)."""
     if not channel_ids:
         return {}
     params = {"key": API_KEY, "part": "snippet", "id": ",".join(channel_ids[:50])}
-    r = requests.get(CHANNELS_URL, params=params, timeout=30)
-    r.raise_for_status()
+    data = await _get_json(session, sem, CHANNELS_URL, params)
     out: Dict[str, str] = {}
-    for it in r.json().get("items", []):
+    for it in data.get("items", []):
         cid = it.get("id")
         handle = (it.get("snippet") or {}).get("customUrl")
         if cid and handle:
             out[cid] = handle
     return out
 
-def fetch_video_details(video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+async def fetch_video_details(session: aiohttp.ClientSession, sem: asyncio.Semaphore, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
     """Return {videoId: {contentDetails, liveStreamingDetails}}"""
     if not video_ids:
         return {}
     params = {"key": API_KEY, "part": "contentDetails,liveStreamingDetails", "id": ",".join(video_ids[:50])}
-    r = requests.get(VIDEOS_URL, params=params, timeout=30)
-    r.raise_for_status()
+    data = await _get_json(session, sem, VIDEOS_URL, params)
     out: Dict[str, Dict[str, Any]] = {}
-    for it in r.json().get("items", []):
+    for it in data.get("items", []):
         vid = it.get("id")
         if vid:
             out[vid] = {
@@ -132,52 +212,91 @@ def fetch_video_details(video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
     return out
 
 # --- Backfill ops ---
-def backfill_handles(candidates: List[Dict[str, Any]], db) -> None:
+def bulk_write_chunked(coll, ops: List[UpdateOne]) -> int:
+    """Send ops as unordered bulk_writes of BULK_CHUNK; returns number of ops sent."""
+    for i in range(0, len(ops), BULK_CHUNK):
+        coll.bulk_write(ops[i:i+BULK_CHUNK], ordered=False)
+    return len(ops)
+
+# channelId -> '@handle', filled from Mongo and the API; survives repeated main() calls in one process
+_HANDLE_CACHE: Dict[str, str] = {}
+
+# (videoId, channelId, source.channelHandle, needs lookup)
+HandleDoc = Tuple[Any, str, Optional[str], bool]
+
+_EMPTY: Dict[str, Any] = {}  # shared read-only fallback for missing subdocs
+
+def classify_candidates(cur) -> Tuple[List[HandleDoc], List[str], List[Any]]:
+    """Single pass over the candidate cursor.
+
+    Keeps only what the two backfill passes need instead of the full docs:
+    compact handle rows, the video ids missing duration/bucket, and every
+    candidate _id (their needsBackfill flag is cleared once the run succeeds).
+    """
+    handle_docs: List[HandleDoc] = []
+    duration_need: List[str] = []
+    ids: List[Any] = []
+    for d in cur:
+        vid = d["_id"]
+        ids.append(vid)
+        total = len(ids)
+        sn = d.get("snippet") or _EMPTY
+        src = d.get("source") or _EMPTY
+        if BF_LOG_SAMPLE and total <= BF_LOG_SAMPLE:
+            if total == 1:
+                print("Sample:")
+            print(f" - {vid} | status={(d.get('tracking') or _EMPTY).get('status')} | handle={sn.get('channelHandle')} | len={sn.get('lengthBucket')} | durISO={sn.get('durationISO')}")
+
+        cid = sn.get("channelId")
+        src_handle = src.get("channelHandle")
+        if BF_FILL_HANDLE and vid and cid:
+            handle_docs.append((vid, cid, src_handle, not sn.get("channelHandle") and not src_handle))
+
+        if BF_FILL_DURATION:
+            bucket = sn.get("lengthBucket")
+            if BF_SKIP_LIVE and bucket == "live":
+                continue
+            if not bucket or not sn.get("durationISO"):
+                duration_need.append(str(vid))
+    return handle_docs, duration_need, ids
+
+async def backfill_handles(handle_docs: List[HandleDoc], db, session: aiohttp.ClientSession, sem: asyncio.Semaphore) -> None:
     if not BF_FILL_HANDLE:
         return
 
-    need: List[str] = []
-    for d in candidates:
-        sn = d.get("snippet", {}) or {}
-        src = d.get("source", {}) or {}
-        cid = sn.get("channelId")
-        if not cid:
-            continue
-        if not sn.get("channelHandle") and not src.get("channelHandle"):
-            need.append(cid)
-    need = sorted(set(need))
+    # Dedupe keeping first-seen order (channels seen together stay in the same batch)
+    need = list(dict.fromkeys(cid for _, cid, _, lookup in handle_docs if lookup))
     if not need:
         print("Handles: nothing to backfill.")
         return
 
-    # Cache
-    cached: Dict[str, str] = {c["_id"]: c.get("handle") for c in db.channels.find({"_id": {"$in": need}}, {"handle": 1})}
+    # Cache: process-local first, then db.channels for the rest
+    cached: Dict[str, str] = {cid: _HANDLE_CACHE[cid] for cid in need if cid in _HANDLE_CACHE}
+    need_db = [cid for cid in need if cid not in cached]
+    if need_db:
+        def _lookup(chunk: List[str]) -> List[Dict[str, Any]]:
+            return list(db.channels.find({"_id": {"$in": chunk}}, {"handle": 1}).hint("_id_"))
+        chunks = [need_db[i:i+LOOKUP_CHUNK] for i in range(0, len(need_db), LOOKUP_CHUNK)]
+        for docs in await asyncio.gather(*(asyncio.to_thread(_lookup, c) for c in chunks)):
+            for c in docs:
+                if c.get("handle"):
+                    cached[c["_id"]] = c["handle"]
     to_fetch = [cid for cid in need if not cached.get(cid)]
 
+    # A failed batch must not discard the ones already paid for: keep every
+    # successful result, write it below, then report the first error
     fetched: Dict[str, str] = {}
-    for i in range(0, len(to_fetch), 50):
-        batch = to_fetch[i:i+50]
-        try:
-            fetched.update(fetch_channel_handles(batch))
-        except requests.HTTPError as e:
-            try:
-                body = e.response.json()
-            except Exception:
-                body = {"error": str(e)}
-            reason = None
-            err = body.get("error") if isinstance(body, dict) else None
-            if isinstance(err, dict):
-                errs = err.get("errors") or []
-                if isinstance(errs, list) and errs:
-                    reason = errs[0].get("reason")
-                reason = reason or err.get("status") or err.get("message")
-            if str(reason) in {"quotaExceeded","dailyLimitExceeded","rateLimitExceeded","userRateLimitExceeded"}:
-                print("Handles: quota exhausted — stop.", file=sys.stderr)
-                raise SystemExit(EXIT_QUOTA)
-            print("Handles: YouTube API error:", body, file=sys.stderr)
-            raise SystemExit(1)
+    errors: List[BaseException] = []
+    batches = [to_fetch[i:i+50] for i in range(0, len(to_fetch), 50)]
+    results = await asyncio.gather(*(fetch_channel_handles(session, sem, b) for b in batches), return_exceptions=True)
+    for part in results:
+        if isinstance(part, BaseException):
+            errors.append(part)
+        else:
+            fetched.update(part)
 
     handle_map = {**cached, **fetched}
+    _HANDLE_CACHE.update(handle_map)
 
     # write cache
     if fetched and not BF_DRY_RUN:
@@ -186,155 +305,222 @@ def backfill_handles(candidates: List[Dict[str, Any]], db) -> None:
             UpdateOne({"_id": cid}, {"$set": {"handle": h, "last_checked_at": now_iso}}, upsert=True)
             for cid, h in fetched.items()
         ]
-        if ops:
-            db.channels.bulk_write(ops, ordered=False)
+        bulk_write_chunked(db.channels, ops)
 
     # update videos
     ops = []
-    for d in candidates:
-        vid = d.get("_id")
-        sn  = d.get("snippet", {}) or {}
-        src = d.get("source", {}) or {}
-        cid = sn.get("channelId")
-        if not vid or not cid:
-            continue
+    for vid, cid, src_handle, _ in handle_docs:
         h = handle_map.get(cid)
         if not h:
             continue
         ops.append(UpdateOne({"_id": vid}, {"$set": {
             "snippet.channelHandle": h,
-            "source.channelHandle": src.get("channelHandle") or h
+            "source.channelHandle": src_handle or h
         }}))
 
     if ops:
         if BF_DRY_RUN:
             print(f"[DRY-RUN] Would update handles for {len(ops)} videos")
         else:
-            db.videos.bulk_write(ops, ordered=False)
+            bulk_write_chunked(db.videos, ops)
             print(f"Handles: updated {len(ops)} videos.")
 
-def backfill_duration(candidates: List[Dict[str, Any]], db) -> None:
+    code = _first_error_code("Handles", errors)
+    if code is not None:
+        raise SystemExit(code)
+
+def _build_update(det_entry: Dict[str, Dict[str, Any]], skip_live: bool) -> Dict[str, Any]:
+    """$set fields for one video from its videos.list entry ({} when nothing to write).
+
+    Kept free of I/O and fully annotated so it can be AOT-compiled with mypyc if the
+    duration pass ever gets CPU-bound (BF_LIMIT in the 10k+ range).
+    """
+    cd: Dict[str, Any] = det_entry.get("contentDetails") or _EMPTY
+    lsd: Dict[str, Any] = det_entry.get("liveStreamingDetails") or _EMPTY
+
+    dur_iso: Optional[str] = cd.get("duration")
+    dur_sec: Optional[int] = iso8601_to_seconds(dur_iso) if dur_iso else None
+
+    length_bucket: Optional[str] = None
+    if dur_sec is not None:
+        length_bucket = bucket_from_seconds(dur_sec)
+    elif lsd.get("actualStartTime") or lsd.get("scheduledStartTime"):
+        length_bucket = "live"
+
+    update_fields: Dict[str, Any] = {}
+    if dur_iso:
+        update_fields["snippet.durationISO"] = dur_iso
+    if dur_sec is not None:
+        update_fields["snippet.durationSec"] = dur_sec
+    if length_bucket and (not skip_live or length_bucket != "live"):
+        update_fields["snippet.lengthBucket"] = length_bucket
+    return update_fields
+
+async def backfill_duration(need: List[str], db, session: aiohttp.ClientSession, sem: asyncio.Semaphore) -> None:
     if not BF_FILL_DURATION:
         return
 
-    # pick ids missing duration or bucket
-    need: List[str] = []
-    for d in candidates:
-        sn = d.get("snippet", {}) or {}
-        if BF_SKIP_LIVE and sn.get("lengthBucket") == "live":
-            continue
-        if (not sn.get("durationISO")) or (not sn.get("lengthBucket")):
-            need.append(str(d["_id"]))
-
+    need = list(dict.fromkeys(need))  # never pay for the same id twice
     if not need:
         print("Duration: nothing to backfill.")
         return
 
-    updated = 0
-    for i in range(0, len(need), 50):
-        batch = need[i:i+50]
-        try:
-            det = fetch_video_details(batch)
-        except requests.HTTPError as e:
-            try:
-                body = e.response.json()
-            except Exception:
-                body = {"error": str(e)}
-            reason = None
-            err = body.get("error") if isinstance(body, dict) else None
-            if isinstance(err, dict):
-                errs = err.get("errors") or []
-                if isinstance(errs, list) and errs:
-                    reason = errs[0].get("reason")
-                reason = reason or err.get("status") or err.get("message")
-            if str(reason) in {"quotaExceeded","dailyLimitExceeded","rateLimitExceeded","userRateLimitExceeded"}:
-                print("Duration: quota exhausted — stop.", file=sys.stderr)
-                raise SystemExit(EXIT_QUOTA)
-            print("Duration: YouTube API error:", body, file=sys.stderr)
-            raise SystemExit(1)
-
-        ops = []
-        for vid in batch:
-            d = det.get(vid) or {}
-            cd = d.get("contentDetails", {}) or {}
-            lsd = d.get("liveStreamingDetails", {}) or {}
-
-            dur_iso = cd.get("duration")
-            dur_sec = iso8601_to_seconds(dur_iso) if dur_iso else None
-
-            length_bucket = None
-            if dur_sec is not None:
-                length_bucket = bucket_from_seconds(dur_sec)
-            elif lsd.get("actualStartTime") or lsd.get("scheduledStartTime"):
-                length_bucket = "live"
-
-            update_fields: Dict[str, Any] = {}
-            if dur_iso:
-                update_fields["snippet.durationISO"] = dur_iso
-            if dur_sec is not None:
-                update_fields["snippet.durationSec"] = dur_sec
-            if length_bucket and (not BF_SKIP_LIVE or length_bucket != "live"):
-                update_fields["snippet.lengthBucket"] = length_bucket
+    batches = [need[i:i+50] for i in range(0, len(need), 50)]
+    # Same as the handle pass: write what succeeded before reporting a failed batch
+    details = await asyncio.gather(*(fetch_video_details(session, sem, b) for b in batches), return_exceptions=True)
 
+    ops: List[UpdateOne] = []
+    errors: List[BaseException] = []
+    for batch, det in zip(batches, details):
+        if isinstance(det, BaseException):
+            errors.append(det)
+            continue
+        for vid in batch:
+            update_fields = _build_update(det.get(vid) or _EMPTY, BF_SKIP_LIVE)
             if update_fields:
                 if BF_DRY_RUN:
                     print(f"[DRY-RUN] {vid} set {update_fields}")
                 else:
                     ops.append(UpdateOne({"_id": vid}, {"$set": update_fields}))
 
-        if ops:
-            if BF_DRY_RUN:
-                print(f"[DRY-RUN] Would update {len(ops)} videos in this batch")
-            else:
-                db.videos.bulk_write(ops, ordered=False)
-                updated += len(ops)
-
     if not BF_DRY_RUN:
+        updated = bulk_write_chunked(db.videos, ops)
         print(f"Duration: updated {updated} videos.")
 
+    code = _first_error_code("Duration", errors)
+    if code is not None:
+        raise SystemExit(code)
+
+def recompute_buckets_server_side(db) -> int:
+    """Fill lengthBucket from an already-stored durationSec with one update_many.
+
+    Same thresholds as bucket_from_seconds; these docs then drop out of
+    build_query() and never reach the videos.list pass.
+    """
+    if not BF_FILL_DURATION:
+        return 0
+    query = {
+        **status_filter(),
+        "snippet.durationSec": {"$exists": True},
+        "snippet.lengthBucket": {"$exists": False},
+    }
+    if BF_DRY_RUN:
+        n = db.videos.count_documents(query)
+        if n:
+            print(f"[DRY-RUN] Would set lengthBucket from durationSec for {n} videos")
+        return n
+    res = db.videos.update_many(query, [{"$set": {"snippet.lengthBucket": {"$switch": {
+        "branches": [
+            {"case": {"$lt": ["$snippet.durationSec", 4*60]}, "then": "short"},
+            {"case": {"$lte": ["$snippet.durationSec", 20*60]}, "then": "medium"},
+        ],
+        "default": "long",
+    }}}}])
+    if res.modified_count:
+        print(f"Duration: set lengthBucket server-side for {res.modified_count} videos.")
+    return res.modified_count
+
 # --- Query candidates ---
-def build_query() -> Dict[str, Any]:
-    status_filter = {}
+def status_filter() -> Dict[str, Any]:
     if BF_TARGET == "complete":
-        status_filter = {"tracking.status": "complete"}
-    elif BF_TARGET == "tracking":
-        status_filter = {"tracking.status": "tracking"}
-    else:
-        status_filter = {"tracking.status": {"$in": ["tracking", "complete"]}}
+        return {"tracking.status": "complete"}
+    if BF_TARGET == "tracking":
+        return {"tracking.status": "tracking"}
+    return {"tracking.status": {"$in": ["tracking", "complete"]}}
 
+def build_query() -> Dict[str, Any]:
+    if not BF_FILL_HANDLE and not BF_FILL_DURATION:
+        # không có nhu cầu backfill nào → trả về query không match
+        return {"_id": None}
+
+    if BF_QUERY_MODE == "flag":
+        # Index seek on the partial needsBackfill index instead of an $exists scan.
+        # Docs written before discover set the flag only match after BF_QUERY_MODE=migrate.
+        query = {"snippet.needsBackfill": True, **status_filter()}
+        if BF_FILL_DURATION and BF_SKIP_LIVE:
+            query["snippet.lengthBucket"] = {"$ne": "live"}
+        return query
+    return build_scan_query()
+
+def build_scan_query() -> Dict[str, Any]:
+    """The $exists-based candidate query; matches docs with or without the needsBackfill flag."""
     # missing conditions
     # Note: tạo cấu trúc $or/$and phù hợp với tùy chọn bật/tắt
     ors = []
-    ands = [status_filter]
+    ands = [status_filter()]
 
     if BF_FILL_HANDLE:
-        ors.extend([
-            {"snippet.channelHandle": {"$exists": False}},
-            {"source.channelHandle": {"$exists": False}},
-        ])
+        # Without a channelId the handle pass skips the doc anyway — don't fetch it for that
+        ors.append({
+            "snippet.channelId": {"$exists": True},
+            "$or": [
+                {"snippet.channelHandle": {"$exists": False}},
+                {"source.channelHandle": {"$exists": False}},
+            ],
+        })
 
     if BF_FILL_DURATION:
-        dur_missing = [
-            {"snippet.durationISO": {"$exists": False}},
-            {"snippet.lengthBucket": {"$exists": False}},
-        ]
+        # "not (durationISO and lengthBucket both present)"
+        ors.append({"$nor": [{
+            "snippet.durationISO": {"$exists": True},
+            "snippet.lengthBucket": {"$exists": True},
+        }]})
         if BF_SKIP_LIVE:
             ands.append({"snippet.lengthBucket": {"$ne": "live"}})
-        ors.extend(dur_missing)
-
-    if not ors:
-        # không có nhu cầu backfill nào → trả về query không match
-        return {"_id": None}
 
     return {"$and": ands + [{"$or": ors}]}
 
-def main() -> int:
+def clear_backfill_flags(db, ids: List[Any]) -> int:
+    """Unset snippet.needsBackfill on the candidates this run has attempted.
+
+    Cleared whether or not every field could be filled (channel without customUrl,
+    BF_FILL_HANDLE=0, deleted video): otherwise BF_QUERY_MODE=flag would re-select the
+    same unfillable docs first on every run and never reach the ones after them.
+    BF_QUERY_MODE=scan still finds whatever is missing, and migrate re-flags it.
+    """
+    cleared = 0
+    for i in range(0, len(ids), BULK_CHUNK):
+        res = db.videos.update_many(
+            {"_id": {"$in": ids[i:i+BULK_CHUNK]}, "snippet.needsBackfill": True},
+            {"$unset": {"snippet.needsBackfill": ""}},
+        )
+        cleared += res.modified_count
+    return cleared
+
+def migrate_backfill_flags(db, dry_run: bool = False) -> int:
+    """One-off: flag legacy docs (written before discover set needsBackfill) that the scan query matches.
+
+    After this has run once, BF_QUERY_MODE=flag finds them through the partial index.
+    Returns how many docs were (or, with dry_run, would be) flagged.
+    """
+    if not BF_FILL_HANDLE and not BF_FILL_DURATION:
+        return 0
+    unflagged = {"$and": [build_scan_query(), {"snippet.needsBackfill": {"$ne": True}}]}
+    if dry_run:
+        return db.videos.count_documents(unflagged)
+    res = db.videos.update_many(unflagged, {"$set": {"snippet.needsBackfill": True}})
+    return res.modified_count
+
+async def main_async() -> int:
     print(">>> backfill_missing_fields starting")
+    client = MongoClient(MONGO_URI)
+    db = client.get_database()
+
+    # Mongo-only; needs no API key
+    if BF_QUERY_MODE == "migrate":
+        if BF_DRY_RUN:
+            print(f"[dry-run] Would flag {migrate_backfill_flags(db, dry_run=True)} legacy videos (needsBackfill=true).")
+        else:
+            print(f"Flagged {migrate_backfill_flags(db)} legacy videos (needsBackfill=true); "
+                  "BF_QUERY_MODE=flag will now find them.")
+        return 0
+
     if not API_KEY:
         print("Missing YT_API_KEY", file=sys.stderr)
         return 2
-    client = MongoClient(MONGO_URI)
-    db = client.get_database()
+
+    # Bucket-only gaps need no API call; settle them before picking candidates
+    recompute_buckets_server_side(db)
 
     query = build_query()
     proj = {
@@ -347,34 +533,43 @@ def main() -> int:
         "snippet.lengthBucket": 1,
         "tracking.status": 1,
     }
-    cur = db.videos.find(query, proj).sort([("_id", 1)]).limit(BF_LIMIT)
-    candidates = list(cur)
-    print(f"Candidates: {len(candidates)} (target={BF_TARGET}, limit={BF_LIMIT})")
+    cur = db.videos.find(query, proj).sort([("_id", 1)]).limit(BF_LIMIT).batch_size(500)
+    handle_docs, duration_need, ids = classify_candidates(cur)
+    total = len(ids)
+    print(f"Candidates: {total} (target={BF_TARGET}, limit={BF_LIMIT})")
 
-    if not candidates:
+    if not total:
         print("Nothing to backfill.")
         return 0
 
-    if BF_LOG_SAMPLE and candidates:
-        print("Sample:")
-        for d in candidates[:BF_LOG_SAMPLE]:
-            sn = d.get("snippet", {}) or {}
-            print(f" - {d['_id']} | status={d.get('tracking',{}).get('status')} | handle={sn.get('channelHandle')} | len={sn.get('lengthBucket')} | durISO={sn.get('durationISO')}")
+    sem = asyncio.Semaphore(HTTP_CONCURRENCY)
+    # One session/connector for every batch: TLS connections to googleapis.com are kept alive and reused
+    connector = aiohttp.TCPConnector(limit=64, limit_per_host=8, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=30)
+    headers = {"Accept-Encoding": "gzip"}
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+        # 1) Handles
+        try:
+            await backfill_handles(handle_docs, db, session, sem)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else EXIT_QUOTA
 
-    # 1) Handles
-    try:
-        backfill_handles(candidates, db)
-    except SystemExit as e:
-        return e.code if isinstance(e.code, int) else EXIT_QUOTA
+        # 2) Duration
+        try:
+            await backfill_duration(duration_need, db, session, sem)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else EXIT_QUOTA
 
-    # 2) Duration
-    try:
-        backfill_duration(candidates, db)
-    except SystemExit as e:
-        return e.code if isinstance(e.code, int) else EXIT_QUOTA
+    if not BF_DRY_RUN:
+        cleared = clear_backfill_flags(db, ids)
+        if cleared:
+            print(f"Cleared needsBackfill on {cleared} videos.")
 
     print("Backfill done.")
     return 0
 
+def main() -> int:
+    return asyncio.run(main_async())
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -10,11 +10,13 @@ Usage:
   python make_indexes_v3.py --show-only       # dry run
   python make_indexes_v3.py --drop-old        # drop indexes not in INDEX_MAP
   python make_indexes_v3.py --collections videos,processed
+  python make_indexes_v3.py --minimal         # only the 3 basic videos indexes (old make_indexes.py)
 """
 
 import os
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
 
 # ---------------- Logging ----------------
@@ -30,8 +32,10 @@ logging.getLogger("").addHandler(console)
 
 # ---------------- Mongo ----------------
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/ytscan")
-client = MongoClient(MONGO_URI)
-db = client.get_database()
+# The client is opened in main(), so importing INDEX_MAP doesn't connect
+
+# createIndex calls within a collection are independent; issue them concurrently
+CREATE_WORKERS = 8
 
 # ---------------- Index Map ----------------
 # Each index spec:
@@ -47,6 +51,15 @@ INDEX_MAP = {
          "name": "trackStatus_nextPoll_activeOnly",
          "partial": {"tracking.status": {"$in": ["queued", "tracking", "retry"]}}},
 
+        # API list endpoints: status filter + sort (see api/main.py API_INDEXES)
+        {"keys": [("tracking.status", 1), ("snippet.publishedAt", -1), ("_id", -1)],
+         "name": "trackStatus_publishedAt_id_desc"},
+        {"keys": [("tracking.status", 1), ("tracking.discovered_at", -1), ("_id", -1)],
+         "name": "trackStatus_discoveredAt_id_desc"},
+        # API /stats: latest discovery regardless of status
+        {"keys": [("tracking.discovered_at", -1)],
+         "name": "discoveredAt_desc"},
+
         # Latest videos per channel
         {"keys": [("snippet.channelId", 1), ("snippet.publishedAt", -1)],
          "name": "channelId_publishedAt_desc"},
@@ -61,6 +74,15 @@ INDEX_MAP = {
                   ("snippet.publishedAt", -1)],
          "name": "category_lengthBucket_publishedAt_desc"},
 
+        # Backfill queue (tools/backfill_missing_fields.py, BF_QUERY_MODE=flag)
+        {"keys": [("snippet.needsBackfill", 1)],
+         "name": "needsBackfill_partial",
+         "partial": {"snippet.needsBackfill": True}},
+
+        # Full-text title search (API `q` parameter)
+        {"keys": [("snippet.title", "text")],
+         "name": "title_text"},
+
         # Plain time sort (keep only if you still query by time alone)
         {"keys": [("snippet.publishedAt", -1)],
          "name": "publishedAt_desc"},
@@ -84,31 +106,60 @@ INDEX_MAP = {
     ],
 }
 
+# The original short make_indexes.py set, kept behind --minimal
+MINIMAL_INDEX_MAP = {
+    "videos": [
+        {"keys": [("tracking.status", 1), ("tracking.next_poll_after", 1)]},
+        {"keys": [("snippet.publishedAt", -1)]},
+        {"keys": [("source.regionCode", 1)]},
+    ],
+}
+
 # ------------- Helpers -------------
 def _index_signature(ixdoc):
     """Return a tuple that uniquely identifies an index by its key ordering."""
+    if "_fts" in ixdoc["key"]:
+        # Text indexes are stored as {_fts: "text", _ftsx: 1}; the fields live in weights
+        return tuple((field, "text") for field in ixdoc.get("weights", {}))
     return tuple(ixdoc["key"].items())
 
 def _spec_signature(spec):
     return tuple(spec["keys"])
 
+def _warn_prefix_redundant(coll_name, specs):
+    """Warn about plain specs whose keys are a strict prefix of another spec's keys.
+
+    A compound index already serves queries on its prefix, so the shorter one only
+    adds write cost. Unique/partial specs are left alone — they carry a constraint.
+    """
+    sigs = [_spec_signature(s) for s in specs]
+    for spec, sig in zip(specs, sigs):
+        if spec.get("unique") or spec.get("partial"):
+            continue
+        for other in sigs:
+            if len(other) > len(sig) and other[:len(sig)] == sig:
+                logging.warning(f"   ⚠️  {coll_name}: {list(sig)} is a prefix of {list(other)} (redundant index?)")
+                break
+
 def _existing_indexes(coll):
     return list(coll.list_indexes())
 
-def create_or_verify_collection_indexes(coll_name, specs, show_only=False):
+def create_or_verify_collection_indexes(db, coll_name, specs, show_only=False):
     coll = db[coll_name]
     existing = _existing_indexes(coll)
     existing_sigs = {_index_signature(ix) for ix in existing}
 
     logging.info(f"\n📂 Collection: {coll_name}")
+    _warn_prefix_redundant(coll_name, specs)
     created = skipped = 0
+    to_create = []
 
     for spec in specs:
         keys = spec["keys"]
         name = spec.get("name")
         unique = spec.get("unique", False)
         partial = spec.get("partial")
-        key_tuple = tuple(keys)
+        key_tuple = _spec_signature(spec)
 
         if key_tuple in existing_sigs:
             # Already exists with these keys (ignore name/options differences)
@@ -131,19 +182,29 @@ def create_or_verify_collection_indexes(coll_name, specs, show_only=False):
         if partial:
             opts["partialFilterExpression"] = partial
 
-        coll.create_index(keys, **opts)
-        logging.info(f"   ✅ Created index: {keys}"
-                     + (f" [name={name}]" if name else "")
-                     + (" [unique]" if unique else "")
-                     + (f" [partial]" if partial else ""))
-        created += 1
+        to_create.append((spec, opts))
+
+    if to_create:
+        with ThreadPoolExecutor(max_workers=min(CREATE_WORKERS, len(to_create))) as ex:
+            futures = [ex.submit(coll.create_index, spec["keys"], **opts) for spec, opts in to_create]
+            for (spec, opts), fut in zip(to_create, futures):
+                fut.result()
+                logging.info(f"   ✅ Created index: {spec['keys']}"
+                             + (f" [name={opts['name']}]" if "name" in opts else "")
+                             + (" [unique]" if opts.get("unique") else "")
+                             + (f" [partial]" if "partialFilterExpression" in opts else ""))
+                created += 1
 
-    return created, skipped
+    return created, skipped, existing
 
-def drop_unused_indexes(coll_name, keep_specs):
+def drop_unused_indexes(db, coll_name, keep_specs, existing):
+    """Drop indexes not in keep_specs.
+
+    `existing` is the listIndexes result from create_or_verify_collection_indexes;
+    anything created since then is in keep_specs, so it needs no second round-trip.
+    """
     coll = db[coll_name]
-    existing = _existing_indexes(coll)
-    keep_sig = {tuple(s["keys"]) for s in keep_specs}
+    keep_sig = {_spec_signature(s) for s in keep_specs}
 
     for ix in existing:
         if ix["name"] == "_id_":
@@ -161,9 +222,15 @@ def main():
                         help="Drop indexes not in the official INDEX_MAP.")
     parser.add_argument("--collections", type=str, default="all",
                         help="Comma-separated list of collections (default: all).")
+    parser.add_argument("--minimal", action="store_true",
+                        help="Only the basic videos indexes (the old short make_indexes.py set).")
     args = parser.parse_args()
 
-    collections = (list(INDEX_MAP.keys())
+    index_map = MINIMAL_INDEX_MAP if args.minimal else INDEX_MAP
+    client = MongoClient(MONGO_URI)
+    db = client.get_database()
+
+    collections = (list(index_map.keys())
                    if args.collections.lower() == "all"
                    else [c.strip() for c in args.collections.split(",")])
 
@@ -171,23 +238,24 @@ def main():
     logging.info("🚀 Starting MongoDB index maintenance...\n")
 
     for coll_name in collections:
-        if coll_name not in INDEX_MAP:
+        if coll_name not in index_map:
             logging.warning(f"⚠️  Unknown collection '{coll_name}' (skipped).")
             continue
 
-        specs = INDEX_MAP[coll_name]
-        created, skipped = create_or_verify_collection_indexes(
-            coll_name, specs, show_only=args.show_only
+        specs = index_map[coll_name]
+        created, skipped, existing = create_or_verify_collection_indexes(
+            db, coll_name, specs, show_only=args.show_only
         )
         total_created += created
         total_skipped += skipped
 
         if args.drop_old and not args.show_only:
-            drop_unused_indexes(coll_name, specs)
+            drop_unused_indexes(db, coll_name, specs, existing)
 
     logging.info("\n✅ Index maintenance complete.")
     logging.info(f"   Total created: {total_created}")
     logging.info(f"   Total skipped: {total_skipped}\n")
+    client.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
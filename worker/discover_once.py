@@ -49,21 +49,49 @@
 #       YT_REGION=US
 #       YT_QUERY=live
 #
+# 3️⃣ Discover source (applies to both modes above)
+#     YT_DISCOVER_MODE=search (default) | trending
+#       - search   : search.list (100 units/page) — supports q / videoDuration
+#       - trending : videos.list?chart=mostPopular (1 unit/page), optionally narrowed by
+#                    YT_TRENDING_CATEGORY_ID. publishedAfter and duration are filtered
+#                    client-side; q is ignored. Items already carry categoryId + duration,
+#                    so no extra videos.list lookup is made.
+#       - YT_TRENDING_SINCE_MINUTES : publishedAfter window for trending (default: 2880 = 48h;
+#                    0 = no cutoff). The chart rarely lists videos younger than a few hours,
+#                    so the near-now YT_SINCE_MINUTES window is not used in trending mode.
+#
+# 4️⃣ Run mode
+#     python worker/discover_once.py [--once]   : single pass, then exit (default; cron / run_both_local.ps1)
+#     python worker/discover_once.py --daemon [--interval N]
+#       - repeats a pass every N seconds (default: DISCOVER_INTERVAL_SECONDS or 1800), reusing the
+#         Mongo pool, the HTTP keep-alive connections and Redis between passes
+#       - SIGINT/SIGTERM stop it after the current pass has written its inserts
+#
 # ---------------------------------------------------------------------------------
 # QUOTA SAFETY
 #   - YT_MAX_PAGES limits the number of search pages (default: 1).
 #     Each page = 50 results (100 quota units for search + 1 for details lookup).
 #   - Recommended for scheduled runs: 1–3 pages per call.
+#   - YT_EMPTY_STREAK_LIMIT stops paging after K consecutive pages that add no new
+#     videos (all filtered out or already in Mongo). Default: 2; 0 disables.
+#   - YT_QUOTA_BUDGET caps units per Pacific-time day for this API key (default: 9500;
+#     0 disables). Spend is counted in the `quota_state` collection across runs; a call
+#     that would go over is not made and the run exits with 88.
+#   - REDIS_URL (optional, needs the redis package) shares videos.list categoryId/duration
+#     lookups across runs for 7 days, so ids another run already resolved cost no quota.
+#   - YT_INSERT_UNACKED=1 sends inserts with write concern w=0 (no server ack).
+#     Faster on high-latency links; insert errors are not reported. Default: 0.
 #
 # ---------------------------------------------------------------------------------
 # DATABASE STRUCTURE
-#   Each discovered video is inserted (upsert) into MongoDB:
+#   Each newly discovered video is inserted into MongoDB (insert-only; known _ids are skipped):
 #     {
 #       _id: <videoId>,
 #       source: { query, regionCode, randomMode, filteredByCategoryId },
 #       snippet: {
-#         title, publishedAt, thumbnails, channelId, channelTitle, categoryId,
-#         durationISO, durationSec, lengthBucket
+#         title, publishedAt, thumbnails (default size only), channelId, channelTitle, categoryId,
+#         durationISO, durationSec, lengthBucket,
+#         needsBackfill      # true until tools/backfill_missing_fields.py has processed the video
 #       },
 #       tracking: { status, discovered_at, next_poll_after, poll_count },
 #       stats_snapshots: [],
@@ -79,6 +107,7 @@
 #
 # ---------------------------------------------------------------------------------
 # RECOMMENDED ENV CONFIG (example .env)
+#   (YT_SKIP_DOTENV=1 skips reading .env when the scheduler already exports the variables)
 #
 #   YT_API_KEY=<your_youtube_api_key>
 #   MONGO_URI=mongodb://localhost:27017/ytscan
@@ -108,13 +137,45 @@
 
 from __future__ import annotations
 
-import os, sys, io, re, random
+import os, sys, io, random, asyncio, atexit, logging, queue, hashlib, signal, argparse
+from logging.handlers import QueueHandler, QueueListener
+from dataclasses import dataclass, field
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, List, Tuple
 
-import requests
-from pymongo import MongoClient, UpdateOne
-from dotenv import load_dotenv
+import aiohttp
+from cachetools import TTLCache
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, WriteConcern
+from pymongo.errors import BulkWriteError, OperationFailure
+
+# Optional: orjson parses response bytes in C; stdlib json (bytes in, no charset sniffing) otherwise
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except Exception:
+    import json
+    _json_loads = json.loads
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+# Optional: shared videos.list cache across runs/processes (disabled when redis is missing or REDIS_URL unset)
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except Exception:
+    aioredis = None  # optional
+    RedisError = Exception
+
+# Optional: aiohttp can only decode brotli ("br") responses when a brotli package is installed
+try:
+    import brotli  # noqa: F401
+    _HAS_BROTLI = True
+except Exception:
+    _HAS_BROTLI = False
 
 # ----- Console UTF-8 (Windows-safe) -----
 try:
@@ -124,7 +185,34 @@ except Exception:
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
-load_dotenv(override=False)
+# Scheduled runs that already export their env can skip the .env lookup
+if os.getenv('YT_SKIP_DOTENV') != '1':
+    from dotenv import load_dotenv
+    load_dotenv(override=False)
+
+# ----- Logging -----
+# Records are queued on the hot path and written to the console by a background
+# listener thread (INFO → stdout, WARNING+ → stderr), so page loops never block on console I/O.
+log = logging.getLogger('ytscan.discover')
+
+
+def _setup_logging() -> None:
+    if log.handlers:
+        return
+    out = logging.StreamHandler(sys.stdout)
+    out.addFilter(lambda r: r.levelno < logging.WARNING)
+    err = logging.StreamHandler(sys.stderr)
+    err.setLevel(logging.WARNING)
+    q: queue.Queue = queue.Queue(-1)
+    listener = QueueListener(q, out, err, respect_handler_level=True)
+    log.addHandler(QueueHandler(q))
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+
+
+_setup_logging()
 
 # ----- Config -----
 API_KEY   = os.getenv('YT_API_KEY')
@@ -142,6 +230,8 @@ GLOBAL_QUERY_POOL = os.getenv('YT_RANDOM_QUERY_POOL', '')
 
 # Near-now window (minutes)
 SINCE_MINUTES = int(os.getenv('YT_SINCE_MINUTES', '20'))  # default 20
+# Trending has its own window: mostPopular almost never holds videos under ~20 min old
+TRENDING_SINCE_MINUTES = max(0, int(os.getenv('YT_TRENDING_SINCE_MINUTES', '2880')))  # default 48h; 0 = no cutoff
 
 # Quota safety: cap number of pages (each page=50 results)
 MAX_PAGES_ENV = os.getenv('YT_MAX_PAGES', '1')  # default 1 page
@@ -150,6 +240,17 @@ try:
 except Exception:
     MAX_PAGES = 1
 
+# Early stop: consecutive pages with zero newly inserted videos (0 = never stop early)
+EMPTY_STREAK_LIMIT = max(0, int(os.getenv('YT_EMPTY_STREAK_LIMIT', '2')))
+
+# Pause between passes in --daemon mode
+DISCOVER_INTERVAL = int(os.getenv('DISCOVER_INTERVAL_SECONDS', '1800'))
+
+# New ids are held across pages and enriched/inserted once this many are pending (and at the end)
+ENRICH_FLUSH_IDS = 200
+# Docs per insert_many call when a flush is written (chunks are sent concurrently)
+INSERT_CHUNK = 1000
+
 # --- NEW: Duration controls ---
 DURATION_MODE = os.getenv('YT_DURATION_MODE', 'any').lower()  # any|short|medium|long|mix
 DURATION_POOL = os.getenv('YT_DURATION_POOL', 'short:1,medium:1,long:1,any:0')
@@ -157,12 +258,68 @@ DURATION_POOL = os.getenv('YT_DURATION_POOL', 'short:1,medium:1,long:1,any:0')
 # --- NEW: Exclude live/upcoming (default ON for VOD-only scans)
 EXCLUDE_LIVE = os.getenv('YT_EXCLUDE_LIVE', '1').lower() in ('1','true','yes')
 
+# Discover source: search.list (keyword/near-now) or the 1-unit mostPopular chart
+DISCOVER_MODE        = os.getenv('YT_DISCOVER_MODE', 'search').lower()  # search|trending
+TRENDING_CATEGORY_ID = os.getenv('YT_TRENDING_CATEGORY_ID') or None
+
+# Unacknowledged (w=0) inserts: skips the server round-trip; inserts are idempotent and
+# the tracker rewrites these docs anyway. Off by default (write errors are not reported).
+INSERT_UNACKED = os.getenv('YT_INSERT_UNACKED', '0').lower() in ('1','true','yes')
+
+# Tag on discover's Mongo ops; shows up in db.currentOp() and the profiler
+MONGO_COMMENT = 'discover_once'
+
 # API endpoints
 SEARCH_URL = 'https://www.googleapis.com/youtube/v3/search'
 VIDEOS_URL = 'https://www.googleapis.com/youtube/v3/videos'
 
+# Server-side projections (`fields`): only what the pipeline reads comes over the wire.
+# Thumbnails are trimmed to the `default` size, which is all that gets stored.
+SEARCH_FIELDS   = 'items(id/videoId,snippet(title,publishedAt,channelId,channelTitle,liveBroadcastContent,thumbnails/default/url)),nextPageToken'
+TRENDING_FIELDS = ('items(id,snippet(title,publishedAt,channelId,channelTitle,categoryId,liveBroadcastContent,thumbnails/default/url),'
+                   'contentDetails/duration),nextPageToken')
+DETAILS_FIELDS  = 'items(id,snippet/categoryId,contentDetails/duration)'
+
+# Quota units per call (YouTube Data API v3 cost table); used for the run summary
+QUOTA_COST = {SEARCH_URL: 100, VIDEOS_URL: 1}
+quota_spent = 0
+
 EXIT_QUOTA = 88
 
+# Daily budget shared by every discover run on the same key, counted in Mongo (quota_state).
+# Calls that would push today's total past it are not made; 0 disables the check.
+QUOTA_BUDGET = max(0, int(os.getenv('YT_QUOTA_BUDGET', '9500')))
+# YouTube quota resets at midnight Pacific time
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TZ = ZoneInfo('America/Los_Angeles')
+except Exception:
+    _QUOTA_TZ = timezone(timedelta(hours=-8))  # no tz database (e.g. Windows without tzdata): PST
+# Set by main_async when the budget is on
+_quota_bucket: Optional['QuotaBucket'] = None
+
+# Max YouTube requests in flight at once (next search page + videos.list batches)
+HTTP_CONCURRENCY = 8
+# Transient 5xx responses are retried on the shared session with exponential backoff
+# (Retry-After wins when sent). 403 is deliberately absent: quota errors must exit 88 at once.
+HTTP_RETRIES      = 5
+HTTP_BACKOFF      = 0.5
+HTTP_RETRY_STATUS = {500, 502, 503, 504}
+# Network-level failures retried with the same backoff (ClientConnectorError = request never sent)
+HTTP_RETRY_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+DNS_CACHE_TTL     = 900
+HTTP_HEADERS      = {'User-Agent': 'yt-autoscanner/discover_once',
+                     'Accept-Encoding': 'gzip, br' if _HAS_BROTLI else 'gzip'}
+
+# videos.list results by id; overlapping pages/windows within one process don't pay quota twice
+_VD_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+
+# Second tier behind _VD_CACHE, shared by every discover run (categoryId/duration don't change)
+REDIS_URL     = os.getenv('REDIS_URL')
+VD_REDIS_TTL  = 7 * 86400
+VD_REDIS_KEY  = 'yt:vd:'
+_redis = None  # set by main_async when REDIS_URL is configured
+
 
 def parse_weighted_pool(val: str) -> Tuple[List[str], List[float]]:
     """
@@ -194,44 +351,72 @@ def parse_weighted_pool(val: str) -> Tuple[List[str], List[float]]:
     return choices, weights
 
 
+@lru_cache(maxsize=32)
+def weighted_pool_cdf(val: str) -> Tuple[Tuple[str, ...], Tuple[float, ...]]:
+    """Parsed pool as (choices, cum_weights), cached per env string for repeat picks."""
+    choices, weights = parse_weighted_pool(val)
+    return tuple(choices), tuple(accumulate(weights))
+
+
+def weighted_pick(choices: Tuple[str, ...], cum_weights: Tuple[float, ...]) -> str:
+    """Single inverse-CDF draw; same distribution as random.choices(k=1)."""
+    i = bisect_right(cum_weights, random.random() * cum_weights[-1])
+    return choices[min(i, len(choices) - 1)]
+
+
+# Query pools parsed once at import (env doesn't change during a process): region → (choices, cum_weights).
+# A region var that is set but blank falls back to the global pool, as before.
+_REGION_POOL_PREFIX = 'YT_RANDOM_QUERY_POOL_'
+_QUERY_POOLS = {
+    name[len(_REGION_POOL_PREFIX):].upper(): weighted_pool_cdf(val.strip())
+    for name, val in os.environ.items()
+    if name.startswith(_REGION_POOL_PREFIX) and val.strip()
+}
+_GLOBAL_QUERY_POOL = weighted_pool_cdf(GLOBAL_QUERY_POOL.strip())
+
+
 def pick_query_for_region(region_code: str) -> Optional[str]:
     """
     Choose a keyword for the given region using region-specific pool if present,
     else fall back to global pool, else None (which means 'no q' param).
     Region-specific env name: YT_RANDOM_QUERY_POOL_<REGION>, e.g., YT_RANDOM_QUERY_POOL_US
     """
-    env_name = f'YT_RANDOM_QUERY_POOL_{region_code.upper()}'
-    val = os.getenv(env_name, '').strip()
-    if not val:
-        val = GLOBAL_QUERY_POOL.strip()
-    choices, weights = parse_weighted_pool(val)
+    choices, cum_weights = _QUERY_POOLS.get(region_code.upper(), _GLOBAL_QUERY_POOL)
     if choices:
-        try:
-            return random.choices(choices, weights=weights, k=1)[0]
-        except Exception:
-            return random.choice(choices)
+        return weighted_pick(choices, cum_weights)
     return None
 
 # --- NEW: duration helpers ---
-_DUR_RE = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?$', re.I)
+_DUR_UNITS = {'H': 3600, 'M': 60, 'S': 1}
 
 def iso8601_to_seconds(s: Optional[str]) -> Optional[int]:
-    if not s:
+    """Parse 'PT#H#M#S' in a single pass (no regex); None if not that shape."""
+    if not s or s[:2].upper() != 'PT':
         return None
-    m = _DUR_RE.match(s)
-    if not m:
+    total = num = 0
+    digits = False
+    last = 4_000  # unit factors must strictly decrease (H > M > S)
+    for c in s[2:]:
+        if '0' <= c <= '9':
+            num = num * 10 + (ord(c) - 48)
+            digits = True
+            continue
+        factor = _DUR_UNITS.get(c.upper())
+        if factor is None or not digits or factor >= last:
+            return None
+        total += num * factor
+        num, digits, last = 0, False, factor
+    if digits:
         return None
-    h, mnt, sec = (int(x) if x else 0 for x in m.groups())
-    return h*3600 + mnt*60 + sec
+    return total
+
+_BUCKETS = ('short', 'medium', 'long')
+_BUCKET_EDGES = (4*60, 20*60 + 1)
 
 def bucket_from_seconds(secs: Optional[int]) -> Optional[str]:
     if secs is None:
         return None
-    if secs < 4*60:
-        return 'short'
-    if secs <= 20*60:
-        return 'medium'
-    return 'long'
+    return _BUCKETS[bisect_right(_BUCKET_EDGES, secs)]
 
 def pick_duration_param() -> Optional[str]:
     """
@@ -239,122 +424,432 @@ def pick_duration_param() -> Optional[str]:
     """
     mode = DURATION_MODE
     if mode == 'mix':
-        choices, weights = parse_weighted_pool(DURATION_POOL)
+        choices, cum_weights = weighted_pool_cdf(DURATION_POOL)
         if not choices:
             return None
-        try:
-            pick = random.choices(choices, weights=weights, k=1)[0]
-        except Exception:
-            pick = random.choice(choices)
+        pick = weighted_pick(choices, cum_weights)
         return pick if pick in {'short','medium','long'} else None
     if mode in {'short','medium','long'}:
         return mode
     return None
 
 
-def search_page(published_after_iso: str, region_code: str, query_str: Optional[str], page_token: Optional[str] = None, video_duration: Optional[str] = None) -> Dict[str, Any]:
+class QuotaBudgetExceeded(Exception):
+    """A call would exceed today's YT_QUOTA_BUDGET; raised before the request is sent."""
+
+
+class QuotaBucket:
+    """
+    Client-side token bucket over the daily YouTube quota, refilled at midnight Pacific.
+    State lives in one Mongo doc per API key (quota_state) so every run on the key shares it;
+    acquire() is a single atomic pipeline update — a stale `date` resets the counter, and
+    `used` only moves when the call fits the budget.
+    """
+    def __init__(self, coll, budget: int, api_key: str):
+        self.coll = coll
+        self.budget = budget
+        # Per-key counter without storing the key itself
+        self.doc_id = 'youtube:' + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+    async def acquire(self, cost: int) -> None:
+        """Take `cost` units, or raise QuotaBudgetExceeded without taking any."""
+        if not cost:
+            return
+        day = datetime.now(_QUOTA_TZ).strftime('%Y-%m-%d')
+        base = {'$cond': [{'$eq': ['$date', day]}, '$used', 0]}
+        prev = await self.coll.find_one_and_update(
+            {'_id': self.doc_id},
+            [{'$set': {
+                'used': {'$let': {'vars': {'b': base, 'n': {'$add': [base, cost]}},
+                                  'in': {'$cond': [{'$lte': ['$$n', self.budget]}, '$$n', '$$b']}}},
+                'date': day,
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+            comment=MONGO_COMMENT,
+        )
+        used = prev['used'] if prev and prev.get('date') == day else 0
+        if used + cost > self.budget:
+            raise QuotaBudgetExceeded(f'{used} + {cost} > {self.budget} units used today')
+
+    async def release(self, cost: int) -> None:
+        """Give back units taken for a call that never reached the API (same day only)."""
+        if not cost:
+            return
+        day = datetime.now(_QUOTA_TZ).strftime('%Y-%m-%d')
+        await self.coll.update_one({'_id': self.doc_id, 'date': day, 'used': {'$gte': cost}},
+                                   {'$inc': {'used': -cost}}, comment=MONGO_COMMENT)
+
+
+class YouTubeAPIError(Exception):
+    """Non-2xx response from the YouTube Data API, with its decoded JSON body."""
+    def __init__(self, status: int, body: Any):
+        super().__init__(f'HTTP {status}')
+        self.status = status
+        self.body = body
+
+
+async def _get_json(session: aiohttp.ClientSession, sem: asyncio.Semaphore, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    global quota_spent
+    async with sem:
+        for attempt in range(HTTP_RETRIES + 1):
+            # Retries are billed too, so each attempt is reserved and counted
+            cost = QUOTA_COST.get(url, 0)
+            if _quota_bucket is not None:
+                await _quota_bucket.acquire(cost)
+            quota_spent += cost
+            try:
+                async with session.get(url, params=params) as resp:
+                    raw = await resp.read()
+                    try:
+                        body = _json_loads(raw)
+                    except ValueError:  # orjson.JSONDecodeError and json.JSONDecodeError both subclass it
+                        body = {'error': raw.decode('utf-8', errors='replace')}
+                    if not (resp.status in HTTP_RETRY_STATUS and attempt < HTTP_RETRIES):
+                        if resp.status >= 400:
+                            raise YouTubeAPIError(resp.status, body)
+                        return body
+                    delay = _retry_delay(resp.headers.get('Retry-After'), attempt)
+                    cause = f'HTTP {resp.status}'
+            except HTTP_RETRY_ERRORS as e:
+                if isinstance(e, aiohttp.ClientConnectorError):
+                    # Connection never opened, so the API never saw (or billed) this attempt.
+                    # Timeouts/disconnects may have reached it and stay charged.
+                    quota_spent -= cost
+                    if _quota_bucket is not None:
+                        await _quota_bucket.release(cost)
+                if attempt >= HTTP_RETRIES:
+                    raise
+                delay = _retry_delay(None, attempt)
+                cause = type(e).__name__
+            # connection is back in the pool while we wait
+            log.warning('[retry] %s from %s; attempt %d/%d in %.1fs', cause, url.rsplit('/', 1)[-1], attempt + 1, HTTP_RETRIES, delay)
+            await asyncio.sleep(delay)
+        raise AssertionError('unreachable')
+
+
+def _retry_delay(retry_after: Optional[str], attempt: int) -> float:
+    """Seconds to wait before retry #attempt+1: Retry-After (delta-seconds) if valid, else backoff."""
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass  # HTTP-date form: fall back to our own backoff
+    return HTTP_BACKOFF * (2 ** attempt)
+
+
+def _error_reason(body: Any) -> Optional[str]:
+    reason = None
+    err = body.get('error') if isinstance(body, dict) else None
+    if isinstance(err, dict):
+        errs = err.get('errors') or []
+        if isinstance(errs, list) and errs:
+            reason = errs[0].get('reason')
+        reason = reason or err.get('status') or err.get('message')
+    return reason
+
+
+@dataclass(frozen=True, slots=True)
+class WindowParams:
+    """Search window for one run: resolved once so every page uses the same horizon."""
+    published_after: str
+    region: str
+    query: Optional[str]
+    video_duration: Optional[str] = None
+    published_before: Optional[str] = None
+    params: Dict[str, Any] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # search.list params shared by every page of the run; pages only add pageToken
+        params = {
+            'key': API_KEY,
+            'part': 'snippet',
+            'type': 'video',
+            'order': 'date',
+            'maxResults': 50,
+            'regionCode': self.region,
+            'publishedAfter': self.published_after,
+            'fields': SEARCH_FIELDS,
+        }
+        if self.published_before:
+            params['publishedBefore'] = self.published_before
+        if self.query:
+            params['q'] = self.query
+        # --- NEW: pass duration filter to search ---
+        if self.video_duration in {'short','medium','long'}:
+            params['videoDuration'] = self.video_duration
+        object.__setattr__(self, 'params', params)
+
+
+async def search_page(session: aiohttp.ClientSession, sem: asyncio.Semaphore, wp: WindowParams, page_token: Optional[str] = None) -> Dict[str, Any]:
+    if not API_KEY:
+        raise RuntimeError('Missing YT_API_KEY')
+    params = {**wp.params, 'pageToken': page_token} if page_token else wp.params
+    return await _get_json(session, sem, SEARCH_URL, params)
+
+
+_EMPTY: Dict[str, Any] = {}  # shared read-only fallback for missing sub-objects
+
+# liveBroadcastContent values for plain uploads (YouTube sends lowercase 'none'; missing/empty = not live)
+_LIVE_NONE = frozenset({'none', '', None})
+
+
+def _extract_vid(it: Dict[str, Any]) -> Optional[str]:
+    """videoId of a search.list-shaped item ({'id': {'videoId': ...}}), or None."""
+    ident = it.get('id')
+    return ident.get('videoId') if ident else None
+
+
+def _parse_iso(s: Optional[str]) -> Optional[datetime]:
+    if not s:
+        return None
+    try:
+        return datetime.fromisoformat(s.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+async def trending_page(session: aiohttp.ClientSession, sem: asyncio.Semaphore, wp: WindowParams, page_token: Optional[str] = None) -> Dict[str, Any]:
+    """One page of chart=mostPopular (1 unit), reshaped like a search.list page.
+
+    The window/duration filters search.list would apply server-side are applied here.
+    Details go straight into _VD_CACHE, so the videos_details() lookup that follows is free.
+    """
     if not API_KEY:
         raise RuntimeError('Missing YT_API_KEY')
     params = {
         'key': API_KEY,
-        'part': 'snippet',
-        'type': 'video',
-        'order': 'date',
+        'part': 'snippet,contentDetails',
+        'chart': 'mostPopular',
+        'regionCode': wp.region,
         'maxResults': 50,
-        'regionCode': region_code,
-        'publishedAfter': published_after_iso,
+        'fields': TRENDING_FIELDS,
     }
-    if query_str:
-        params['q'] = query_str
-    # --- NEW: pass duration filter to search ---
-    if video_duration in {'short','medium','long'}:
-        params['videoDuration'] = video_duration
+    if TRENDING_CATEGORY_ID:
+        params['videoCategoryId'] = TRENDING_CATEGORY_ID
     if page_token:
         params['pageToken'] = page_token
-    r = requests.get(SEARCH_URL, params=params, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    data = await _get_json(session, sem, VIDEOS_URL, params)
+
+    after = _parse_iso(wp.published_after)
+    items = []
+    for it in data.get('items', []):
+        vid = it.get('id')
+        sn = it.get('snippet') or {}
+        cd = it.get('contentDetails') or {}
+        published = _parse_iso(sn.get('publishedAt'))
+        if not vid or (after and (published is None or published < after)):
+            continue
+        if wp.video_duration and bucket_from_seconds(iso8601_to_seconds(cd.get('duration'))) != wp.video_duration:
+            continue
+        _VD_CACHE[vid] = {'snippet': sn, 'contentDetails': cd}
+        items.append({'id': {'videoId': vid}, 'snippet': dict(sn)})
+    return {'items': items, 'nextPageToken': data.get('nextPageToken')}
 
 
-def videos_details(video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+async def videos_details(session: aiohttp.ClientSession, sem: asyncio.Semaphore, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
     """Return {videoId: {'snippet':..., 'contentDetails':...}} to enrich categoryId + duration (1 quota per 50 IDs)."""
     out: Dict[str, Dict[str, Any]] = {}
     if not video_ids:
         return out
-    batched = [video_ids[i:i+50] for i in range(0, len(video_ids), 50)]
-    for batch in batched:
-        params = {'key': API_KEY, 'part': 'snippet,contentDetails', 'id': ','.join(batch)}
-        r = requests.get(VIDEOS_URL, params=params, timeout=30)
-        r.raise_for_status()
-        for it in r.json().get('items', []):
+    misses = []
+    # Deduped (order kept) so a repeated id can't spill a batch past 50 and cost an extra unit
+    for vid in dict.fromkeys(video_ids):
+        hit = _VD_CACHE.get(vid)
+        if hit is not None:
+            out[vid] = hit
+        else:
+            misses.append(vid)
+    if misses and _redis is not None:
+        # One MGET for everything the process cache didn't have
+        try:
+            cached = await _redis.mget([VD_REDIS_KEY + vid for vid in misses])
+        except RedisError as e:
+            log.warning('Redis read skipped: %s', e)
+            cached = [None] * len(misses)
+        still = []
+        for vid, raw in zip(misses, cached):
+            if raw:
+                out[vid] = _VD_CACHE[vid] = _json_loads(raw)
+            else:
+                still.append(vid)
+        misses = still
+    batched = [misses[i:i+50] for i in range(0, len(misses), 50)]
+    pages = await asyncio.gather(*(
+        _get_json(session, sem, VIDEOS_URL, {'key': API_KEY, 'part': 'snippet,contentDetails', 'id': ','.join(batch), 'fields': DETAILS_FIELDS})
+        for batch in batched
+    ))
+    fetched: Dict[str, Dict[str, Any]] = {}
+    for data in pages:
+        for it in data.get('items', []):
             vid = it.get('id')
             if vid:
-                out[vid] = {
+                out[vid] = _VD_CACHE[vid] = fetched[vid] = {
                     'snippet': it.get('snippet', {}) or {},
                     'contentDetails': it.get('contentDetails', {}) or {}
                 }
+    if fetched and _redis is not None:
+        try:
+            async with _redis.pipeline(transaction=False) as pipe:
+                for vid, det in fetched.items():
+                    pipe.setex(VD_REDIS_KEY + vid, VD_REDIS_TTL, _json_dumps(det))
+                await pipe.execute()
+        except RedisError as e:
+            log.warning('Redis write skipped: %s', e)
     return out
 
 
-def upsert_minimal(items: List[Dict[str, Any]], db, region_used: str, query_used: Optional[str]) -> int:
-    """Insert minimal video docs; tracker will enrich/track later.
-    Fix: avoid MongoDB update path conflict on 'snippet' by NOT including it in $setOnInsert.
+def enrich_snippets(keyed: List[Tuple[str, Dict[str, Any]]], det_map: Dict[str, Dict[str, Any]]) -> Tuple[int, int]:
+    """Copy categoryId + duration fields from videos.list details onto each item's snippet.
+    Returns (enriched_category, enriched_duration)."""
+    enriched_cate = 0
+    enriched_dur  = 0
+    for vid, it in keyed:
+        sn = it.get('snippet', {}) or {}
+        det = det_map.get(vid) or _EMPTY
+        sn2 = det.get('snippet') or _EMPTY
+        cd  = det.get('contentDetails') or _EMPTY
+
+        # categoryId
+        cate = sn2.get('categoryId')
+        if cate:
+            sn['categoryId'] = cate
+            enriched_cate += 1
+
+        # --- NEW: duration enrichment
+        dur_iso = cd.get('duration')
+        secs = iso8601_to_seconds(dur_iso) if dur_iso else None
+        if dur_iso:
+            sn['durationISO'] = dur_iso
+        if secs is not None:
+            sn['durationSec'] = secs
+            sn['lengthBucket'] = bucket_from_seconds(secs)
+            enriched_dur += 1
+
+        it['snippet'] = sn
+    return enriched_cate, enriched_dur
+
+
+# Indexes the discover → track pipeline relies on. Names/keys mirror tools/make_indexes.py
+# INDEX_MAP so both can run against the same DB without option conflicts; update both together.
+#   - channelId_publishedAt_desc: latest videos per channel (API/dashboard reads)
+#   - trackStatus_nextPoll:       track_once queue scan over freshly inserted videos
+# (_id needs nothing: the skip-known $in read in known_ids uses the built-in _id index.)
+DISCOVER_INDEXES = [
+    IndexModel([('snippet.channelId', ASCENDING), ('snippet.publishedAt', DESCENDING)], name='channelId_publishedAt_desc'),
+    IndexModel([('tracking.status', ASCENDING), ('tracking.next_poll_after', ASCENDING)], name='trackStatus_nextPoll'),
+    # Same keys over live queue states only: the tracker's status='tracking' AND next_poll_after<=now scan
+    # walks a B-tree that excludes every completed video
+    IndexModel([('tracking.status', ASCENDING), ('tracking.next_poll_after', ASCENDING)], name='trackStatus_nextPoll_activeOnly',
+               partialFilterExpression={'tracking.status': {'$in': ['queued', 'tracking', 'retry']}}),
+    # Recent-first listings, overall and per discovery region (same names as tools/make_indexes.py)
+    IndexModel([('snippet.publishedAt', DESCENDING)], name='publishedAt_desc'),
+    IndexModel([('source.regionCode', ASCENDING), ('snippet.publishedAt', DESCENDING)], name='region_publishedAt_desc'),
+]
+
+# Set after the first successful check; a process that calls main() repeatedly doesn't re-issue it
+_INDEXED = False
+
+
+async def ensure_indexes(db) -> None:
+    """Idempotent: createIndexes is a no-op for indexes that already exist."""
+    global _INDEXED
+    if _INDEXED:
+        return
+    for model in DISCOVER_INDEXES:
+        try:
+            await db.videos.create_indexes([model])
+        except OperationFailure as e:
+            # e.g. same keys under another name from a hand-made index; discovery still works without it
+            log.warning('Index check skipped (%s): %s', model.document['name'], e)
+    _INDEXED = True
+
+
+# Initial ml_flags for a new video (shared by every inserted doc; never mutated)
+ML_FLAGS_INIT = {'likely_viral': False, 'viral_confirmed': False, 'score': 0.0}
+
+# Time-independent part of a new video's tracking block; timestamps are added per batch
+TRACKING_INIT = {'status': 'tracking', 'last_polled_at': None, 'poll_count': 0, 'stop_reason': None}
+
+
+async def known_ids(db, vids: List[str]) -> set:
+    """_ids among `vids` already in Mongo (one indexed $in read)."""
+    if not vids:
+        return set()
+    return {d['_id'] async for d in db.videos.find({'_id': {'$in': vids}}, {'_id': 1}, comment=MONGO_COMMENT)}
+
+
+async def upsert_minimal(items: List[Dict[str, Any]], db, region_used: str, query_used: Optional[str],
+                         existing: Optional[set] = None) -> int:
+    """Insert minimal video docs for new videos; tracker will enrich/track later.
+    Insert-only: videos already in Mongo are left untouched (duplicate _id → E11000, ignored).
+    `existing` is the known-_id set if the caller already looked it up.
     """
-    ops = []
+    if existing is None:
+        # Steady-state pages are mostly known videos, so skip building those docs
+        existing = await known_ids(db, [v for it in items if (v := _extract_vid(it))])
+
+    # Sized up front (at most one doc per item), trimmed after the loop
+    docs: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    k = 0
+    # Formatted once per batch; every doc references the same string
     now_iso = datetime.now(timezone.utc).isoformat()
+    # Identical for every doc in the batch: build once and share the reference
+    # (never mutated afterwards; BSON encoding only reads them)
+    source_tmpl = {
+        'query': query_used,
+        'regionCode': region_used,
+        'randomMode': bool(RANDOM_PICK),
+    }
+    tracking_tmpl = {**TRACKING_INIT, 'discovered_at': now_iso, 'next_poll_after': now_iso}
     for it in items:
-        vid = it.get('id', {}).get('videoId')
-        sn  = it.get('snippet', {}) or {}
-        if not vid or not sn:
+        vid = _extract_vid(it)
+        sn  = it.get('snippet') or _EMPTY
+        if not vid or not sn or vid in existing:
             continue
-        # Build full doc (for insert) then separate snippet into $set to prevent path conflict.
-        full_doc = {
+        sn_get = sn.get
+        docs[k] = {
             '_id': vid,
-            'source': {
-                'query': query_used,
-                'regionCode': region_used,
-                'randomMode': bool(RANDOM_PICK),
-            },
+            'source': source_tmpl,
             'snippet': {
-                'title': sn.get('title'),
-                'publishedAt': sn.get('publishedAt'),
-                'thumbnails': sn.get('thumbnails', {}),
-                'channelId': sn.get('channelId'),
-                'channelTitle': sn.get('channelTitle'),
-                'categoryId': sn.get('categoryId'),   # set by enrichment above
-                'durationISO': sn.get('durationISO'),
-                'durationSec': sn.get('durationSec'),
-                'lengthBucket': sn.get('lengthBucket'),
-            },
-            'tracking': {
-                'status': 'tracking',
-                'discovered_at': now_iso,
-                'last_polled_at': None,
-                'next_poll_after': now_iso,
-                'poll_count': 0,
-                'stop_reason': None,
+                'title': sn_get('title'),
+                'publishedAt': sn_get('publishedAt'),
+                'thumbnails': sn_get('thumbnails', {}),
+                'channelId': sn_get('channelId'),
+                'channelTitle': sn_get('channelTitle'),
+                'categoryId': sn_get('categoryId'),   # set by enrichment above
+                'durationISO': sn_get('durationISO'),
+                'durationSec': sn_get('durationSec'),
+                'lengthBucket': sn_get('lengthBucket'),
+                'needsBackfill': True,                # channel handle is never known at discover time
             },
+            'tracking': tracking_tmpl,
             'stats_snapshots': [],
-            'ml_flags': {'likely_viral': False, 'viral_confirmed': False, 'score': 0.0},
+            'ml_flags': ML_FLAGS_INIT,
         }
-        insert_doc = full_doc.copy()
-        insert_doc.pop('snippet', None)  # <-- critical: do not duplicate 'snippet' path in $setOnInsert
-        update_doc = {
-            '$setOnInsert': insert_doc,
-            '$set': {'snippet': full_doc['snippet']},
-        }
-        ops.append(UpdateOne({'_id': vid}, update_doc, upsert=True))
-    if not ops:
+        k += 1
+    del docs[k:]
+    if not docs:
         return 0
-    res = db.videos.bulk_write(ops, ordered=False)
-    return int(res.upserted_count or 0)
+    if INSERT_UNACKED:
+        # No reply to read; docs were pre-filtered against `existing`, so report what was sent
+        videos = db.get_collection('videos', write_concern=WriteConcern(w=0))
+        await videos.insert_many(docs, ordered=False, comment=MONGO_COMMENT)
+        return len(docs)
+    try:
+        res = await db.videos.insert_many(docs, ordered=False, comment=MONGO_COMMENT)
+        return len(res.inserted_ids)
+    except BulkWriteError as bwe:
+        # Already-known videos fail with duplicate key (11000); anything else is a real error
+        if any(e.get('code') != 11000 for e in bwe.details.get('writeErrors', [])):
+            raise
+        return int(bwe.details.get('nInserted', 0))
 
 
-def main() -> int:
-    print('>>> discover_once SCAN-ONLY (near-now + categoryId + duration filter) starting')
-    if not API_KEY:
-        print('Missing YT_API_KEY', file=sys.stderr)
-        return 2
+async def run_once(db, session: aiohttp.ClientSession, sem: asyncio.Semaphore) -> int:
+    """One discovery pass (region/query/window picked fresh); returns that pass's exit code."""
+    global quota_spent
+    quota_spent = 0
 
     # region pick
     region_used = (random.choice(RANDOM_REGION_POOL) if RANDOM_PICK and RANDOM_REGION_POOL else REGION)
@@ -366,115 +861,259 @@ def main() -> int:
     if not query_used:
         query_used = QUERY  # may be None/empty → omit q
 
-    client = MongoClient(MONGO_URI)
-    db = client.get_database()
     now = datetime.now(timezone.utc)
-    published_after = (now - timedelta(minutes=SINCE_MINUTES)).isoformat()
+    if DISCOVER_MODE == 'trending':
+        # '' = no cutoff; trending_page only filters when it gets a timestamp
+        published_after = (now - timedelta(minutes=TRENDING_SINCE_MINUTES)).isoformat() if TRENDING_SINCE_MINUTES else ''
+    else:
+        published_after = (now - timedelta(minutes=SINCE_MINUTES)).isoformat()
 
     duration_used = pick_duration_param()
-    print(f'Near-now slice: {published_after}..(now) | region={region_used} | query={query_used!r} | random={RANDOM_PICK} | duration={duration_used or "any"} | exclude_live={EXCLUDE_LIVE}')
+    wp = WindowParams(published_after, region_used, query_used, duration_used)
+    log.info('Near-now slice: %s..(now) | region=%s | query=%r | random=%s | duration=%s | exclude_live=%s | source=%s',
+             published_after, region_used, query_used, RANDOM_PICK, duration_used or 'any', EXCLUDE_LIVE, DISCOVER_MODE)
+    if DISCOVER_MODE == 'trending' and query_used:
+        log.info('Trending source ignores query=%r (chart=mostPopular has no q).', query_used)
 
-    page_token = None
     pages = 0
     total_found = 0
     total_upserted = 0
+    empty_streak = 0
+    early_stop = False
+    quota_stop = False
+
+    next_search: Optional[asyncio.Task] = None
+    page_fn = trending_page if DISCOVER_MODE == 'trending' else search_page
+
+    def fetch_page(token: Optional[str]) -> asyncio.Task:
+        return asyncio.create_task(page_fn(session, sem, wp, token))
+
+    seen: set = set()
+    pending: List[Tuple[str, Dict[str, Any]]] = []
+    ready: List[Dict[str, Any]] = []
+
+    async def flush_pending() -> int:
+        """Enrich the accumulated new items in one go and insert them; returns inserted count.
+
+        Each flush is written as soon as it is enriched, so a pass that dies later (cancel,
+        kill) keeps every batch whose enrichment quota was already spent.
+        """
+        if not pending:
+            return 0
+        batch = pending[:]
+        # Enrich categoryId + duration (1 quota per 50 ids, batches fetched concurrently);
+        # `pending` is only cleared once that succeeded, so a failure can still store the batch
+        det_map = await videos_details(session, sem, [vid for vid, _ in batch])
+        pending.clear()
+        enriched_cate, enriched_dur = enrich_snippets(batch, det_map)
+        log.info('[enrich] ids=%d, enriched_category=%d, enriched_duration=%d', len(batch), enriched_cate, enriched_dur)
+        # Preview as one record: one queue hop and one stream write per flush, not per line
+        log.info('\n'.join(
+            f" - {vid} | {sn.get('publishedAt')} | len={sn.get('lengthBucket')} | cate={sn.get('categoryId')} | {sn.get('title')}"
+            for vid, it in batch[:5]
+            for sn in (it.get('snippet') or _EMPTY,)
+        ))
+        ready.extend(it for _, it in batch)
+        return await insert_ready()
+
+    async def insert_ready() -> int:
+        """Write the enriched backlog: INSERT_CHUNK-sized insert_many calls sent concurrently."""
+        if not ready:
+            return 0
+        chunks = [ready[i:i+INSERT_CHUNK] for i in range(0, len(ready), INSERT_CHUNK)]
+        ready.clear()
+        # Already filtered against Mongo page by page, so skip the lookup in upsert_minimal
+        counts = await asyncio.gather(*(
+            upsert_minimal(chunk, db, region_used, query_used, existing=set()) for chunk in chunks
+        ))
+        return sum(counts)
+
+    async def save_partial(enrich: bool = True) -> None:
+        """Best effort when a pass fails midway: store everything it already found (and paid for).
+        Pending ids are enriched if the API still answers (and enrich is set), else inserted as-is
+        (needsBackfill covers duration)."""
+        if enrich:
+            try:
+                await flush_pending()
+            except Exception as e:
+                log.warning('Enrichment skipped while saving partial results: %s', e)
+        ready.extend(it for _, it in pending)
+        pending.clear()
+        try:
+            saved = await insert_ready()
+            log.info('Saved %d new video(s) from the interrupted pass.', saved)
+        except Exception as e:
+            log.error('Could not save partial results: %s', e)
 
     try:
-        while True:
-            if pages >= MAX_PAGES:
-                print(f'Reached YT_MAX_PAGES={MAX_PAGES}, stop.')
-                break
-            pages += 1
-
-            data = search_page(published_after, region_used, query_used, page_token, duration_used)
-            items = data.get('items', [])
-            found = len(items)
-            # --- NEW: Early filter to remove live/upcoming VOD placeholders
-            filtered = 0
-            if EXCLUDE_LIVE and found > 0:
-                before = len(items)
-                items = [
-                    it for it in items
-                    if (it.get('snippet', {}).get('liveBroadcastContent') or 'none').lower() == 'none'
-                ]
-                filtered = before - len(items)
-                if filtered:
-                    print(f'[page {pages}] filtered_live={filtered}')
+        try:
+            if MAX_PAGES >= 1:
+                next_search = fetch_page(None)
+            while True:
+                if next_search is None:
+                    log.info('Reached YT_MAX_PAGES=%d, stop.', MAX_PAGES)
+                    break
+                pages += 1
 
-            total_found += len(items)
+                try:
+                    data = await next_search
+                except QuotaBudgetExceeded as e:
+                    # Not enough budget for another page: stop paging, but still enrich/store
+                    # what was found (videos.list costs 1 unit per 50 and may still fit)
+                    next_search = None
+                    log.warning('Quota budget reached before page %d: %s', pages, e)
+                    quota_stop = True
+                    break
+                next_search = None
+                # Prefetch page N+1 while page N is filtered and enriched (never past YT_MAX_PAGES)
+                page_token = data.get('nextPageToken')
+                if page_token and pages < MAX_PAGES:
+                    next_search = fetch_page(page_token)
 
-            # Enrich categoryId + duration for ALL items (1 quota per 50)
-            if items:
-                ids = [it.get('id', {}).get('videoId') for it in items if it.get('id', {}).get('videoId')]
-                det_map = videos_details(ids)
-                enriched_cate = 0
-                enriched_dur  = 0
+                items = data.get('items', [])
+                found = len(items)
+                # One pass: extract each videoId once (reused for the Mongo lookup, enrich loop and
+                # insert) and drop live/upcoming placeholders inline when EXCLUDE_LIVE is on
+                # A video repeated within the page or across pages is kept once (first occurrence)
+                keyed = []
+                filtered = 0
                 for it in items:
-                    vid = it.get('id', {}).get('videoId')
-                    if not vid:
+                    if EXCLUDE_LIVE and (it.get('snippet') or _EMPTY).get('liveBroadcastContent') not in _LIVE_NONE:
+                        filtered += 1
                         continue
-                    sn = it.get('snippet', {}) or {}
-                    det = det_map.get(vid) or {}
-                    sn2 = det.get('snippet', {}) or {}
-                    cd  = det.get('contentDetails', {}) or {}
-
-                    # categoryId
-                    cate = sn2.get('categoryId')
-                    if cate:
-                        sn['categoryId'] = cate
-                        enriched_cate += 1
-
-                    # --- NEW: duration enrichment
-                    dur_iso = cd.get('duration')
-                    secs = iso8601_to_seconds(dur_iso) if dur_iso else None
-                    if dur_iso:
-                        sn['durationISO'] = dur_iso
-                    if secs is not None:
-                        sn['durationSec'] = secs
-                        sn['lengthBucket'] = bucket_from_seconds(secs)
-                        enriched_dur += 1
-
-                    it['snippet'] = sn
-
-                print(f'[page {pages}] found={found}, enriched_category={enriched_cate}, enriched_duration={enriched_dur}')
-
-            up = upsert_minimal(items, db, region_used, query_used)
-            total_upserted += up
-
-            for it in items[:5]:
-                vid = it.get('id', {}).get('videoId')
-                sn  = it.get('snippet', {})
-                print(f' - {vid} | {sn.get("publishedAt")} | len={sn.get("lengthBucket")} | cate={sn.get("categoryId")} | {sn.get("title")}')
-
-            page_token = data.get('nextPageToken')
-            if not page_token:
-                break
-
-        print(f'>>> DONE. pages={pages}, total_found={total_found}, total_upserted={total_upserted}')
-        return 0
+                    vid = _extract_vid(it)
+                    if vid and vid not in seen:
+                        seen.add(vid)
+                        keyed.append((vid, it))
+                if filtered:
+                    log.info('[page %d] filtered_live=%d', pages, filtered)
 
-    except requests.HTTPError as e:
-        # Detect quota exhaustion
-        try:
-            body = e.response.json()
+                total_found += found - filtered
+
+                # Videos already in Mongo are never rewritten (insert-only), so don't spend
+                # videos.list quota enriching them
+                known = await known_ids(db, [vid for vid, _ in keyed])
+                if known:
+                    keyed = [(vid, it) for vid, it in keyed if vid not in known]
+                log.info('[page %d] found=%d, known=%d, new=%d', pages, found, len(known), len(keyed))
+                empty_streak = 0 if keyed else empty_streak + 1
+
+                # New items wait here so videos.list is called with full 50-id batches across pages
+                pending.extend(keyed)
+                if len(pending) >= ENRICH_FLUSH_IDS:
+                    total_upserted += await flush_pending()
+
+                if not page_token:
+                    break
+                if EMPTY_STREAK_LIMIT and empty_streak >= EMPTY_STREAK_LIMIT:
+                    log.info('Early stop: %d consecutive page(s) without new videos.', empty_streak)
+                    early_stop = True
+                    break
+            total_upserted += await flush_pending()
         except Exception:
-            body = {'error': str(e)}
-        reason = None
-        err = body.get('error') if isinstance(body, dict) else None
-        if isinstance(err, dict):
-            errs = err.get('errors') or []
-            if isinstance(errs, list) and errs:
-                reason = errs[0].get('reason')
-            reason = reason or err.get('status') or err.get('message')
-        if getattr(e.response, 'status_code', None) == 403 and str(reason) in {'quotaExceeded','dailyLimitExceeded','rateLimitExceeded','userRateLimitExceeded'}:
-            print('YouTube quota exhausted — update YT_API_KEY.', file=sys.stderr)
+            # Whatever stopped the pass (API error, quota, timeout, Mongo), keep what it found
+            await save_partial()
+            raise
+        except BaseException:
+            # Cancelled / interrupted: no new API calls, just store what is already in hand
+            await save_partial(enrich=False)
+            raise
+        finally:
+            # Don't leave a prefetched page running on a closing session
+            if next_search is not None:
+                next_search.cancel()
+
+        log.info('>>> DONE. pages=%d, total_found=%d, total_upserted=%d, early_stop=%s, quota_units=%d', pages, total_found, total_upserted, early_stop, quota_spent)
+        return EXIT_QUOTA if quota_stop else 0
+
+    except QuotaBudgetExceeded as e:
+        log.error('Daily quota budget reached (YT_QUOTA_BUDGET=%d): %s', QUOTA_BUDGET, e)
+        return EXIT_QUOTA
+    except YouTubeAPIError as e:
+        # Detect quota exhaustion
+        body = e.body
+        reason = _error_reason(body)
+        if e.status == 403 and str(reason) in {'quotaExceeded','dailyLimitExceeded','rateLimitExceeded','userRateLimitExceeded'}:
+            log.error('YouTube quota exhausted — update YT_API_KEY.')
             return EXIT_QUOTA
-        print('YouTube API error:', body, file=sys.stderr)
+        log.error('YouTube API error: %s', body)
         return 1
     except Exception as e:
-        print('Error:', e, file=sys.stderr)
+        log.error('Error: %s', e)
         return 1
 
 
+def _install_stop_handlers(stop: asyncio.Event) -> None:
+    """SIGINT/SIGTERM end the daemon after the current pass (its inserts are written first)."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows event loops: Ctrl+C still raises KeyboardInterrupt
+
+
+async def main_async(daemon: bool = False, interval: int = 1800) -> int:
+    log.info('>>> discover_once SCAN-ONLY (near-now + categoryId + duration filter) starting')
+    if not API_KEY:
+        log.error('Missing YT_API_KEY')
+        return 2
+
+    # Async driver: reads/writes share the event loop with the in-flight API requests.
+    # Imported here so a run that exits on config errors never loads it.
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client.get_database()
+    global _quota_bucket, _redis
+    _quota_bucket = QuotaBucket(db.quota_state, QUOTA_BUDGET, API_KEY) if QUOTA_BUDGET else None
+    if aioredis is not None and REDIS_URL:
+        _redis = aioredis.from_url(REDIS_URL, max_connections=8)
+
+    sem = asyncio.Semaphore(HTTP_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=30)
+    stop = asyncio.Event()
+    if daemon:
+        _install_stop_handlers(stop)
+
+    try:
+        await ensure_indexes(db)
+        # One pooled connector for the whole process: TLS connections to googleapis.com stay alive and are
+        # reused across pages (and passes in --daemon); resolved addresses are cached for 15 min (aiohttp
+        # default is 10s). Created here so the session below always owns and closes it.
+        connector = aiohttp.TCPConnector(limit=16, limit_per_host=16, keepalive_timeout=60,
+                                         use_dns_cache=True, ttl_dns_cache=DNS_CACHE_TTL)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HTTP_HEADERS) as session:
+            while True:
+                rc = await run_once(db, session, sem)
+                if not daemon or stop.is_set():
+                    return rc
+                log.info('Next pass in %ds (exit code of this pass: %d).', interval, rc)
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=interval)
+                    return rc
+                except asyncio.TimeoutError:
+                    pass
+    except Exception as e:
+        log.error('Error: %s', e)
+        return 1
+    finally:
+        client.close()
+        if _redis is not None:
+            await _redis.aclose()
+            _redis = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description='Discover near-now YouTube videos into MongoDB.')
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument('--once', action='store_true', help='single pass, then exit (default)')
+    mode.add_argument('--daemon', action='store_true',
+                      help='repeat every --interval seconds, keeping Mongo/HTTP/Redis connections warm')
+    ap.add_argument('--interval', type=int, default=DISCOVER_INTERVAL,
+                    help='seconds between passes with --daemon (default: DISCOVER_INTERVAL_SECONDS or 1800)')
+    args = ap.parse_args(argv)
+    return asyncio.run(main_async(daemon=args.daemon, interval=max(1, args.interval)))
+
+
 if __name__ == '__main__':
     raise SystemExit(main())
@@ -21,6 +21,14 @@ except Exception:
     UpdateOne = None    # optional
     ReplaceOne = None   # optional
 
+# Optional pyarrow (only for --summary-feather)
+try:
+    import pyarrow as pa
+    import pyarrow.feather as pa_feather
+except Exception:
+    pa = None        # optional
+    pa_feather = None
+
 # Optional dotenv loader
 try:
     from dotenv import load_dotenv
@@ -298,6 +306,16 @@ def build_dashboard_summary(rows:List[Dict[str,Any]])->List[Dict[str,Any]]:
         })
     return out
 
+def write_summary_feather(rows:List[Dict[str,Any]], path:Path) -> None:
+    """Write dashboard summary rows as a zstd Arrow IPC (Feather v2) file.
+
+    Readers can memory-map it (pyarrow.ipc.open_file) instead of parsing JSON.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for --summary-feather")
+    table = pa.Table.from_pylist(rows)
+    pa_feather.write_feather(table, str(path), compression="zstd")
+
 def read_from_mongo(uri:str,db_name:str,coll:str, query:dict|None=None):
     if MongoClient is None:
         raise RuntimeError("pymongo not installed")
@@ -441,6 +459,7 @@ def main():
     ap.add_argument("--input-json")
     ap.add_argument("--out-processed", default="processed_videos.json")
     ap.add_argument("--out-summary", default="dashboard_summary.json")
+    ap.add_argument("--summary-feather", action="store_true", help="Also write the summary as Arrow/Feather (same name, .feather extension; needs pyarrow)")
     ap.add_argument("--to-mongo", action="store_true", help="(Optional) Explicitly upsert outputs into Mongo (default: ON)")
     ap.add_argument("--no-mongo", action="store_true", help="Disable upserting outputs into Mongo")
     ap.add_argument("--query", help="MongoDB query as JSON string, e.g. '{\"tracking.status\":\"complete\"}'")
@@ -583,6 +602,14 @@ def main():
     print(f"\n✅ Wrote {p_out_processed} ({len(processed)} rows)")
     print(f"✅ Wrote {p_out_summary} ({len(summary)} rows)")
 
+    if args.summary_feather:
+        p_out_feather = p_out_summary.with_suffix(".feather")
+        try:
+            write_summary_feather(summary, p_out_feather)
+            print(f"✅ Wrote {p_out_feather} ({len(summary)} rows)")
+        except Exception as e:
+            print(f"⚠️ Failed to write {p_out_feather.name}: {e}", file=sys.stderr)
+
     # Optional: upsert outputs back to Mongo (default ON)
     do_push = True
     if args.no_mongo:
@@ -8,6 +8,8 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pymongo import MongoClient, UpdateOne
 from dotenv import load_dotenv
 
@@ -47,6 +49,16 @@ VIDEOS_URL   = "https://www.googleapis.com/youtube/v3/videos"
 CHANNELS_URL = "https://www.googleapis.com/youtube/v3/channels"
 EXIT_QUOTA   = 88
 
+# One pooled session for every API call: the HTTPS connection to googleapis.com is kept
+# alive across batches; transient 5xx are retried with backoff (4xx, incl. quota, are not)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504],
+                      allowed_methods=["GET"], raise_on_status=False),
+))
+SESSION.headers.update({"Accept-Encoding": "gzip", "User-Agent": "yt-autoscanner/track_once"})
+
 # --- Duration helpers (for backfill) ---
 _DUR_RE = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?$', re.I)
 
@@ -88,7 +100,7 @@ def fetch_stats(video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
     if not video_ids:
         return {}
     params = {"key": API_KEY, "part": "statistics", "id": ",".join(video_ids[:50])}
-    r = requests.get(VIDEOS_URL, params=params, timeout=30)
+    r = SESSION.get(VIDEOS_URL, params=params, timeout=30)
     r.raise_for_status()
     out: Dict[str, Dict[str, Any]] = {}
     for it in r.json().get("items", []):
@@ -102,7 +114,7 @@ def fetch_channel_handles(channel_ids: List[str]) -> Dict[str, str]:
     if not channel_ids:
         return {}
     params = {"key": API_KEY, "part": "snippet", "id": ",".join(channel_ids[:50])}
-    r = requests.get(CHANNELS_URL, params=params, timeout=30)
+    r = SESSION.get(CHANNELS_URL, params=params, timeout=30)
     r.raise_for_status()
     out: Dict[str, str] = {}
     for it in r.json().get("items", []):
@@ -185,7 +197,7 @@ def enrich_duration_for_missing_videos(due_docs: List[Dict[str, Any]], db) -> No
             "part": "contentDetails,liveStreamingDetails",
             "id": ",".join(batch)
         }
-        r = requests.get(VIDEOS_URL, params=params, timeout=30)
+        r = SESSION.get(VIDEOS_URL, params=params, timeout=30)
         r.raise_for_status()
 
         items = r.json().get("items", [])
@@ -241,7 +253,7 @@ def main() -> int:
     due_cur = (db.videos.find({
         "tracking.status": "tracking",
         "tracking.next_poll_after": {"$lte": now_iso}
-    }, {"_id": 1, "snippet.publishedAt": 1, "snippet.channelId": 1, "snippet.channelHandle": 1, "source.channelHandle": 1, "tracking": 1, "snippet.durationISO": 1, "snippet.lengthBucket": 1})
+    }, {"_id": 1, "snippet.publishedAt": 1, "snippet.channelId": 1, "snippet.channelHandle": 1, "source.channelHandle": 1, "tracking.next_poll_after": 1, "snippet.durationISO": 1, "snippet.lengthBucket": 1})
     .sort("tracking.next_poll_after", 1)
     .limit(TRACK_MAX_DUE))
 